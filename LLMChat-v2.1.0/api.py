@@ -1,56 +1,217 @@
 import aiohttp
+import asyncio
 import json
-import openai
-import requests
+import time
 from tenacity import retry, stop_after_attempt, wait_exponential
+import db
+from sse import iter_sse
+from tokenizer import count_tokens
+from context import MESSAGE_OVERHEAD_TOKENS
+from pricing import catalog_prices, set_catalog_prices, compute_cost
+from model_registry import catalog_limits, set_catalog_limits, model_info, fit_max_tokens
+import response_cache
 
-async def fetch_models_async(provider, api_key, url=None, headers=None, known_models=None):
-    """Fetch models for a provider asynchronously with retry."""
+# Base URL per provider; also the key the pooled clients are registered under
+PROVIDER_BASE_URLS = {
+    "OpenAI": "https://api.openai.com/v1",
+    "OpenRouter": "https://openrouter.ai/api/v1",
+    "XAI": "https://api.x.ai/v1",
+    "Anthropic": "https://api.anthropic.com/v1",
+    "HuggingFace": "https://api-inference.huggingface.co",
+    "Google": "https://generativelanguage.googleapis.com/v1beta",
+    "Perplexity": "https://api.perplexity.ai",
+    "Together": "https://api.together.ai",
+    "Groq": "https://api.groq.com/openai/v1",
+    "Pi": "https://api.pi.ai/v1",
+    "Mistral": "https://api.mixtral.ai/v1",
+    "DeepSeek": "https://api.deepseek.com/v1",
+}
+
+# Providers that speak the OpenAI chat completions streaming protocol
+OPENAI_COMPATIBLE_PROVIDERS = ["OpenAI", "OpenRouter", "XAI", "Groq", "Perplexity", "Together", "Pi", "Mistral", "DeepSeek"]
+# Of those, the ones that accept stream_options and send token usage in a final chunk
+STREAM_USAGE_PROVIDERS = ["OpenAI", "OpenRouter", "XAI", "Groq", "DeepSeek"]
+
+# Connection pool tuning shared by all provider clients
+POOL_SIZE = 10
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+# No overall deadline so long generations can stream; only stalls are treated as failures
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=15, sock_read=120)
+
+# Seconds a saved model listing is used as is before the provider is asked again; aggregators,
+# whose listings and prices change often, are revalidated sooner
+MODEL_CATALOG_TTLS = {"OpenRouter": 3600, "HuggingFace": 6 * 3600, "Together": 6 * 3600}
+DEFAULT_MODEL_CATALOG_TTL = 24 * 3600
+# Seconds each provider's model listing may take before it is given up on for this refresh;
+# aggregators return thousands of models and get longer
+MODEL_FETCH_DEADLINES = {"OpenRouter": 20, "HuggingFace": 20, "Together": 15}
+DEFAULT_MODEL_FETCH_DEADLINE = 10
+# A listing slower than this is reported as slow
+SLOW_MODEL_FETCH = 3
+
+# Long-lived sessions keyed by (provider, base_url, api_key), created lazily
+_http_sessions = {}
+
+def get_catalog_session():
+    """The pooled session shared by every provider's model listing request; keys go in per-request headers."""
+    return get_http_session("catalog", None, None)
+
+def get_http_session(provider, base_url, api_key):
+    """Return the pooled keep-alive aiohttp session for a provider, creating it on first use."""
+    key = (provider, base_url, api_key)
+    session = _http_sessions.get(key)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit_per_host=POOL_SIZE, keepalive_timeout=KEEPALIVE_TIMEOUT, ttl_dns_cache=DNS_CACHE_TTL
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=REQUEST_TIMEOUT)
+        _http_sessions[key] = session
+    return session
+
+async def close_clients():
+    """Close every pooled provider session. Must run on the loop that created them."""
+    for session in _http_sessions.values():
+        if not session.closed:
+            await session.close()
+    _http_sessions.clear()
+
+def _model_ids(models):
+    return sorted([model.get("id", model.get("name", "")) for model in models])
+
+async def load_model_catalog():
+    """The saved model listings, as {provider: {"models", "fetched_at", "etag", "last_modified"}}."""
+    catalog = {}
+    for row in await db.fetch_model_catalog_from_db():
+        try:
+            models = json.loads(row["models"])
+        except ValueError:
+            continue
+        catalog[row["provider"]] = {
+            "models": models, "fetched_at": row["fetched_at"], "etag": row["etag"], "last_modified": row["last_modified"]
+        }
+    return catalog
+
+def cached_model_ids(catalog):
+    """Model ids by provider from saved listings, for filling the model menu before any fetch."""
+    return {provider: _model_ids(entry["models"]) for provider, entry in catalog.items()}
+
+async def fetch_models_async(provider, api_key, url=None, headers=None, known_models=None, cached=None, max_age=None, timeout=None):
+    """Fetch models for a provider, reusing its saved listing while it is younger than max_age.
+
+    max_age defaults to the provider's TTL; 0 always asks the provider. A stale listing is
+    revalidated with its ETag or Last-Modified, so an unchanged one costs a 304 and no body.
+    timeout bounds the whole request. Errors are raised; iter_all_models falls back to the saved listing.
+    """
     if not api_key:
         return []
-    try:
-        if known_models:
-            return sorted(known_models)
-        async with aiohttp.ClientSession() as session:
-            headers = headers or {"Authorization": f"Bearer {api_key}"}
-            async with session.get(url, headers=headers) as resp:
-                resp.raise_for_status()
-                data = await resp.json()
-                models = data.get("data", data.get("models", []))
-                return sorted([model.get("id", model.get("name", "")) for model in models])
-    except Exception as e:
-        print(f"Error fetching {provider} models: {e}")
-        return []
+    if known_models:
+        return sorted(known_models)
+    if max_age is None:
+        max_age = MODEL_CATALOG_TTLS.get(provider, DEFAULT_MODEL_CATALOG_TTL)
+    if cached and time.time() - cached["fetched_at"] < max_age:
+        return _model_ids(cached["models"])
+    headers = dict(headers or {"Authorization": f"Bearer {api_key}"})
+    if cached and cached["etag"]:
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached["last_modified"]:
+        headers["If-Modified-Since"] = cached["last_modified"]
+    async with get_catalog_session().get(url, headers=headers, timeout=timeout) as resp:
+        if resp.status == 304 and cached:
+            await db.touch_model_catalog_in_db(provider, time.time())
+            return _model_ids(cached["models"])
+        resp.raise_for_status()
+        data = await resp.json()
+        etag, last_modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+    models = data if isinstance(data, list) else data.get("data", data.get("models", []))
+    await db.save_model_catalog_in_db(provider, json.dumps(models), time.time(), etag, last_modified)
+    prices = catalog_prices(provider, models)
+    limits = catalog_limits(provider, models)
+    if prices:
+        set_catalog_prices(provider, prices)
+    if limits:
+        set_catalog_limits(provider, limits)
+    if prices or limits:
+        await db.save_model_metadata_in_db(provider, prices, limits)
+    return _model_ids(models)
 
-async def fetch_all_models(config):
-    """Fetch models from all providers concurrently."""
-    model_groups = {
-        'OpenAI': [], 'OpenRouter': [], 'XAI': [], 'Anthropic': [], 'HuggingFace': [],
-        'Google': [], 'Perplexity': [], 'Together': [], 'Groq': [], 'Pi': [],
-        'Mistral': [], 'DeepSeek': []
+def _flag(value):
+    return None if value is None else bool(value)
+
+async def load_saved_metadata():
+    """Price and size models from the catalog metadata saved by earlier fetches, before any fresh listing arrives."""
+    prices, limits = {}, {}
+    for row in await db.fetch_model_metadata_from_db():
+        provider, model_id = row["provider"], row["model_id"]
+        if row["input_price"] is not None and row["output_price"] is not None:
+            prices.setdefault(provider, {})[model_id] = (row["input_price"], row["output_price"], row["cached_input_price"])
+        entry = (
+            row["context_window"], row["max_output_tokens"], _flag(row["supports_streaming"]),
+            _flag(row["supports_vision"]), _flag(row["supports_system_prompt"]),
+        )
+        if any(value is not None for value in entry):
+            limits.setdefault(provider, {})[model_id] = entry
+    for provider, provider_prices in prices.items():
+        set_catalog_prices(provider, provider_prices)
+    for provider, provider_limits in limits.items():
+        set_catalog_limits(provider, provider_limits)
+
+def model_sources(config):
+    """fetch_models_async arguments by provider, for the providers with an API key set."""
+    sources = {
+        "OpenAI": {"url": "https://api.openai.com/v1/models"},
+        "OpenRouter": {"url": "https://openrouter.ai/api/v1/models"},
+        "XAI": {"url": "https://api.x.ai/v1/models"},
+        "Anthropic": {"known_models": ["claude-3-opus-20240229", "claude-3-sonnet-20240229", "claude-3-haiku-20240307"]},
+        "HuggingFace": {"url": "https://api-inference.huggingface.co/models"},
+        "Google": {"url": f"https://generativelanguage.googleapis.com/v1beta/models?key={config['google_api_key']}"},
+        "Perplexity": {"known_models": ["llama-3-sonar-large-32k-online", "llama-3-sonar-small-32k-online"]},
+        "Together": {"url": "https://api.together.ai/models"},
+        "Groq": {"url": "https://api.groq.com/openai/v1/models"},
+        "Pi": {"known_models": ["xAI-Pi"]},
+        "Mistral": {"url": "https://api.mixtral.ai/v1/models"},
+        "DeepSeek": {"url": "https://api.deepseek.com/v1/models"},
     }
-    tasks = [
-        (fetch_models_async("OpenAI", config["openai_api_key"], "https://api.openai.com/v1/models"), "OpenAI"),
-        (fetch_models_async("OpenRouter", config["openrouter_api_key"], "https://openrouter.ai/api/v1/models"), "OpenRouter"),
-        (fetch_models_async("XAI", config["xai_api_key"], "https://api.x.ai/v1/models"), "XAI"),
-        (fetch_models_async("Anthropic", config["anthropic_api_key"], known_models=["claude-3-opus-20240229", "claude-3-sonnet-20240229", "claude-3-haiku-20240307"]), "Anthropic"),
-        (fetch_models_async("HuggingFace", config["huggingface_api_key"], "https://api-inference.huggingface.co/models"), "HuggingFace"),
-        (fetch_models_async("Google", config["google_api_key"], f"https://generativelanguage.googleapis.com/v1beta/models?key={config['google_api_key']}"), "Google"),
-        (fetch_models_async("Perplexity", config["perplexity_api_key"], known_models=["llama-3-sonar-large-32k-online", "llama-3-sonar-small-32k-online"]), "Perplexity"),
-        (fetch_models_async("Together", config["together_api_key"], "https://api.together.ai/models"), "Together"),
-        (fetch_models_async("Groq", config["groq_api_key"], "https://api.groq.com/openai/v1/models"), "Groq"),
-        (fetch_models_async("Pi", config["pi_api_key"], known_models=["xAI-Pi"]), "Pi"),
-        (fetch_models_async("Mistral", config["mistral_api_key"], "https://api.mixtral.ai/v1/models"), "Mistral"),
-        (fetch_models_async("DeepSeek", config["deepseek_api_key"], "https://api.deepseek.com/v1/models"), "DeepSeek")
-    ]
-    results = await asyncio.gather(*(task[0] for task in tasks), return_exceptions=True)
-    for (task, provider), result in zip(tasks, results):
-        if not isinstance(result, Exception):
-            model_groups[provider] = result
-    return model_groups
-
-async def process_ai_response(app, selected_model_full, messages, config):
-    """Process AI response with streaming and cost/token tracking."""
+    return {provider: source for provider, source in sources.items() if config.get(f"{provider.lower()}_api_key")}
+
+async def iter_all_models(config, catalog=None, max_age=None):
+    """Fetch every provider's models concurrently, yielding each result as soon as it is ready.
+
+    Yields (provider, model_ids, elapsed_seconds, error). error is None on success; when a
+    provider fails or misses its deadline it names the problem and model_ids is the saved
+    listing, if there is one, so one slow endpoint never holds back the others.
+    """
+    catalog = catalog or {}
+
+    async def fetch(provider, source):
+        cached = catalog.get(provider)
+        deadline = MODEL_FETCH_DEADLINES.get(provider, DEFAULT_MODEL_FETCH_DEADLINE)
+        start = time.perf_counter()
+        try:
+            models = await fetch_models_async(
+                provider, config[f"{provider.lower()}_api_key"], cached=cached, max_age=max_age,
+                timeout=aiohttp.ClientTimeout(total=deadline), **source
+            )
+            error = None
+        except asyncio.TimeoutError:
+            models, error = None, f"timed out after {deadline} s"
+        except aiohttp.ClientResponseError as e:
+            models, error = None, f"HTTP {e.status}"
+        except Exception as e:
+            models, error = None, str(e) or type(e).__name__
+        if error:
+            models = _model_ids(cached["models"]) if cached else []
+        return provider, models, time.perf_counter() - start, error
+
+    for result in asyncio.as_completed([fetch(provider, source) for provider, source in model_sources(config).items()]):
+        yield await result
+
+async def process_ai_response(app, selected_model_full, messages, config, settings):
+    """Process AI response with streaming and cost/token tracking.
+
+    settings holds max_tokens, temperature, top_p, presence_penalty and frequency_penalty, read
+    from the Tk variables on the Tk thread before the request is handed to this loop.
+    """
     if not selected_model_full or "No models" in selected_model_full:
         app.add_log_message("Error: No model selected.", "error")
         return
@@ -65,138 +226,274 @@ async def process_ai_response(app, selected_model_full, messages, config):
         app.add_log_message(f"Error: {provider} API key not set.", "error")
         return
 
-    client_config = {}
+    provider_base = PROVIDER_BASE_URLS.get(provider)
     base_url = None
     headers = {"Content-Type": "application/json"}
-    if provider == "OpenAI":
-        client_config = {"api_key": api_key}
-    elif provider == "OpenRouter":
-        client_config = {"api_key": api_key, "base_url": "https://openrouter.ai/api/v1"}
-    elif provider == "XAI":
-        client_config = {"api_key": api_key, "base_url": "https://api.x.ai/v1"}
-    elif provider == "Anthropic":
+    if provider == "Anthropic":
         headers["x-api-key"] = api_key
         headers["anthropic-version"] = "2023-06-01"
-        base_url = "https://api.anthropic.com/v1/messages"
+        base_url = f"{provider_base}/messages"
     elif provider == "HuggingFace":
         headers["Authorization"] = f"Bearer {api_key}"
-        base_url = f"https://api-inference.huggingface.co/models/{model_id}"
+        base_url = f"{provider_base}/models/{model_id}"
     elif provider == "Google":
-        base_url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_id}:generateContent?key={api_key}"
-    elif provider == "Perplexity":
-        headers["Authorization"] = f"Bearer {api_key}"
-        base_url = "https://api.perplexity.ai/chat/completions"
+        # The model listing returns names as "models/<id>"
+        gemini_model = model_id[len("models/"):] if model_id.startswith("models/") else model_id
+        base_url = f"{provider_base}/models/{gemini_model}:streamGenerateContent?alt=sse&key={api_key}"
     elif provider == "Together":
         headers["Authorization"] = f"Bearer {api_key}"
-        base_url = "https://api.together.ai/v1/chat/completions"
-    elif provider == "Groq":
-        client_config = {"api_key": api_key, "base_url": "https://api.groq.com/openai/v1"}
-    elif provider == "Pi":
-        headers["Authorization"] = f"Bearer {api_key}"
-        base_url = "https://api.pi.ai/v1/chat/completions"
-    elif provider == "Mistral":
+        base_url = f"{provider_base}/v1/chat/completions"
+    elif provider in OPENAI_COMPATIBLE_PROVIDERS:
         headers["Authorization"] = f"Bearer {api_key}"
-        base_url = "https://api.mixtral.ai/v1/chat/completions"
-    elif provider == "DeepSeek":
-        headers["Authorization"] = f"Bearer {api_key}"
-        base_url = "https://api.deepseek.com/v1/chat/completions"
+        base_url = f"{provider_base}/chat/completions"
     else:
         app.add_log_message(f"Error: Unknown provider '{provider}'.", "error")
         return
 
+    # Check the request against the model's limits here rather than have the provider reject it
+    info = model_info(provider, model_id)
+    if not info.streaming:
+        app.add_log_message(f"Error: {model_id} does not support streaming chat responses.", "error")
+        return
+    if not info.system_prompt:
+        messages = fold_system_prompt(messages)
+    prompt_tokens = sum(count_tokens(msg["content"], selected_model_full) + MESSAGE_OVERHEAD_TOKENS for msg in messages)
+    max_tokens, reason = fit_max_tokens(info, settings["max_tokens"], prompt_tokens)
+    if max_tokens < 1:
+        app.add_log_message(
+            f"Error: the prompt ({prompt_tokens:,} tokens) fills the {info.context_window:,}-token context window of {model_id}.", "error"
+        )
+        return
+    if reason:
+        worst_cost = compute_cost(provider, model_id, prompt_tokens, max_tokens)
+        at_most = f"; this request costs at most ${worst_cost:.4f}" if worst_cost is not None else ""
+        app.add_log_message(f"Max tokens lowered to {max_tokens:,} for {model_id}: {reason}{at_most}.", "system")
+
     try:
+        data = {
+            "model": model_id,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": settings["temperature"],
+            "top_p": settings["top_p"],
+            "stream": provider != "HuggingFace"
+        }
         if provider in ["OpenAI", "OpenRouter", "XAI", "Groq"]:
-            client = openai.OpenAI(**client_config)
-            response_stream = client.chat.completions.create(
-                model=model_id, messages=messages,
-                temperature=app.temperature_var.get(), max_tokens=app.max_tokens_var.get(),
-                presence_penalty=app.presence_penalty_var.get(), frequency_penalty=app.frequency_penalty_var.get(),
-                top_p=app.top_p_var.get(), stream=True
-            )
-            full_response = ""
-            message_frame = None
-            label = None
-            tokens = 0
-            for chunk in response_stream:
-                text = chunk.choices[0].delta.content or ""
-                if text:
-                    full_response += text
-                    tokens += 1  # Approximate token count
-                    if not message_frame:
-                        message_frame, label = app.create_message_frame("assistant", "")
-                    app.debounce_stream_update(full_response, message_frame, label)
-            cost = estimate_cost(provider, model_id, tokens)  # Simplified cost estimation
+            data["presence_penalty"] = settings["presence_penalty"]
+            data["frequency_penalty"] = settings["frequency_penalty"]
+        if provider in STREAM_USAGE_PROVIDERS:
+            data["stream_options"] = {"include_usage": True}
+        cache_key, cached = None, None
+        if config.get("response_cache"):
+            # Everything that shapes the reply; stream and stream_options only change how it is delivered
+            params = {name: value for name, value in data.items() if name not in ("model", "messages", "stream", "stream_options")}
+            cache_key = response_cache.cache_key(provider, model_id, messages, params)
+            cached = await response_cache.lookup(cache_key)
+        if cached is not None:
+            # Replayed through the same render path as a streamed reply, in one delta
+            buffer = StreamBuffer(app)
+            buffer.append(cached["response"])
+            full_response = buffer.getvalue()
+            usage = {"input_tokens": cached["input_tokens"], "output_tokens": cached["output_tokens"]}
         else:
-            data = {
-                "model": model_id,
-                "messages": messages,
-                "max_tokens": app.max_tokens_var.get(),
-                "temperature": app.temperature_var.get(),
-                "top_p": app.top_p_var.get(),
-                "stream": True if provider in ["Perplexity", "Together", "Pi", "Mistral", "DeepSeek"] else False
-            }
+            session = get_http_session(provider, provider_base, api_key)
             if provider == "Anthropic":
-                response = requests.post(base_url, headers=headers, json=data)
-                response.raise_for_status()
-                full_response = response.json()["content"][0]["text"]
-                tokens = len(full_response.split())  # Approximate
+                full_response, usage = await stream_anthropic(app, session, base_url, headers, data)
             elif provider == "HuggingFace":
                 data["inputs"] = "\n".join([msg["content"] for msg in messages])
-                response = requests.post(base_url, headers=headers, json=data)
-                response.raise_for_status()
-                full_response = response.json()[0]["generated_text"]
-                tokens = len(full_response.split())
+                async with session.post(base_url, headers=headers, json=data) as response:
+                    response.raise_for_status()
+                    result = await response.json()
+                buffer = StreamBuffer(app)
+                buffer.append(result[0]["generated_text"])
+                full_response = buffer.getvalue()
+                usage = {}
             elif provider == "Google":
-                data = {
-                    "contents": [{"parts": [{"text": msg["content"]} for msg in messages]}],
-                    "generationConfig": {
-                        "maxOutputTokens": app.max_tokens_var.get(),
-                        "temperature": app.temperature_var.get(),
-                        "topP": app.top_p_var.get()
-                    }
-                }
-                response = requests.post(base_url, headers=headers, json=data)
-                response.raise_for_status()
-                full_response = response.json()["candidates"][0]["content"]["parts"][0]["text"]
-                tokens = len(full_response.split())
+                full_response, usage = await stream_gemini(app, session, base_url, headers, messages, max_tokens, settings)
             else:
-                response = requests.post(base_url, headers=headers, json=data, stream=True)
-                response.raise_for_status()
-                full_response = ""
-                message_frame = None
-                label = None
-                tokens = 0
-                for line in response.iter_lines():
-                    if line:
-                        decoded_line = line.decode('utf-8')
-                        if decoded_line.startswith("data:"):
-                            data = json.loads(decoded_line[5:])
-                            if "choices" in data and data["choices"]:
-                                text = data["choices"][0].get("delta", {}).get("content", "") or ""
-                                if text:
-                                    full_response += text
-                                    tokens += 1
-                                    if not message_frame:
-                                        message_frame, label = app.create_message_frame("assistant", "")
-                                    app.debounce_stream_update(full_response, message_frame, label)
-            cost = estimate_cost(provider, model_id, tokens)
+                full_response, usage = await stream_openai_compatible(app, session, base_url, headers, data)
+        input_tokens = usage.get("input_tokens")
+        output_tokens = usage.get("output_tokens")
+        cached_tokens = usage.get("cached_tokens") or 0
+        reported = input_tokens is not None and output_tokens is not None
+        # The reply's own size, which is what it adds to later prompts; billed output can be far
+        # larger, as it includes reasoning and thinking tokens the reply does not contain
+        reply_tokens = count_tokens(full_response, selected_model_full)
+        # Count locally whatever the provider did not report
+        if input_tokens is None:
+            input_tokens = prompt_tokens
+        if output_tokens is None:
+            output_tokens = reply_tokens
+        cost = compute_cost(provider, model_id, input_tokens, output_tokens, cached_tokens)
+        saved_cost = None
+        if cached is not None:
+            # A replay is not billed
+            saved_cost, cost = cost, 0.0
+        elif cache_key and full_response.strip():
+            await response_cache.store(cache_key, provider, model_id, full_response, input_tokens, output_tokens, cost)
 
         if full_response.strip() and app.current_conversation_id:
-            app.conversation_log.append({"role": "assistant", "content": full_response})
-            await db.add_message_to_db(app.current_conversation_id, "assistant", full_response, tokens=tokens, cost=cost)
-            app.add_log_message(f"Tokens: {tokens}, Estimated Cost: ${cost:.4f}", "system")
-            if app.tts_provider.get() != "None":
-                app.play_message(full_response)
+            # The one place a reply is recorded; the UI never persists assistant text it renders
+            app.record_message(
+                "assistant", full_response, tokens=reply_tokens, cost=cost,
+                input_tokens=input_tokens, output_tokens=output_tokens, model=selected_model_full
+            )
+            if cached is not None:
+                saved = f"saved ${saved_cost:.4f}" if saved_cost is not None else "saved an unpriced request"
+                app.add_log_message(
+                    f"Usage (cached reply from {time.strftime('%Y-%m-%d %H:%M', time.localtime(cached['created_at']))}): "
+                    f"{input_tokens:,} input, {output_tokens:,} output tokens, no request sent ({saved})",
+                    "system"
+                )
+            else:
+                app.add_log_message(
+                    f"Usage ({'reported' if reported else 'estimated'}): {input_tokens:,} input ({cached_tokens:,} cached), "
+                    f"{output_tokens:,} output tokens, cost {f'${cost:.4f}' if cost is not None else 'unknown (no price for this model)'}",
+                    "system"
+                )
+            if cache_key:
+                stats = await response_cache.cache_stats()
+                app.add_log_message(
+                    f"Response cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+                    f"{stats['entries']} replies, {stats['size'] / 1_000_000:.1f} MB",
+                    "system"
+                )
+            app.ui_queue.post(app.autoplay_message, full_response)
     except Exception as e:
         app.add_log_message(f"API Error ({provider} {model_id}): {str(e)}", "error")
 
-def estimate_cost(provider, model_id, tokens):
-    """Estimate API cost based on provider and model (simplified)."""
-    # Placeholder pricing (update with actual rates)
-    pricing = {
-        "OpenAI": {"gpt-4": 0.03 / 1000, "gpt-3.5-turbo": 0.0015 / 1000},
-        "XAI": {"grok": 0.01 / 1000},
-        # Add other providers
+def fold_system_prompt(messages):
+    """messages for a model that rejects system messages: their text leads the first user message instead."""
+    system_parts = [msg["content"] for msg in messages if msg["role"] == "system"]
+    messages = [msg for msg in messages if msg["role"] != "system"]
+    if not system_parts:
+        return messages
+    for i, msg in enumerate(messages):
+        if msg["role"] == "user":
+            messages[i] = dict(msg, content="\n\n".join(system_parts + [msg["content"]]))
+            return messages
+    return [{"role": "user", "content": "\n\n".join(system_parts)}] + messages
+
+class StreamBuffer:
+    """Append-only chunk buffer for a streaming reply.
+
+    Each delta is handed to the UI as it arrives and the UI appends it to the transcript item; the
+    full text is only joined once, when the stream finishes. The UI creates the item on the Tk
+    thread when it renders the first delta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.chunks = []
+        self.item = None
+
+    def append(self, text):
+        if not text:
+            return
+        self.chunks.append(text)
+        self.app.schedule_stream_update(text, self)
+
+    def getvalue(self):
+        return "".join(self.chunks)
+
+    def __len__(self):
+        return len(self.chunks)
+
+async def stream_openai_compatible(app, session, url, headers, data):
+    """Stream an OpenAI-style chat completions response over SSE. Returns (full_response, usage).
+
+    usage has input_tokens, output_tokens and cached_tokens, each None if the provider did not report it.
+    """
+    buffer = StreamBuffer(app)
+    usage = {}
+    async with session.post(url, headers=headers, json=data) as response:
+        response.raise_for_status()
+        async for sse_event in iter_sse(response):
+            chunk = sse_event.json()
+            # With include_usage the totals come in a final chunk with no choices; Groq nests them under x_groq
+            usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage") or usage
+            choices = chunk.get("choices")
+            if not choices:
+                continue
+            buffer.append(choices[0].get("delta", {}).get("content"))
+    # OpenAI reports cache hits in prompt_tokens_details, DeepSeek as prompt_cache_hit_tokens
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens", usage.get("prompt_cache_hit_tokens"))
+    return buffer.getvalue(), {
+        "input_tokens": usage.get("prompt_tokens"),
+        "output_tokens": usage.get("completion_tokens"),
+        "cached_tokens": cached,
+    }
+
+async def stream_anthropic(app, session, url, headers, data):
+    """Stream an Anthropic Messages API response over SSE. Returns (full_response, usage)."""
+    # System prompts (including uploaded file context) go in the top-level field, not in messages
+    system_parts = [msg["content"] for msg in data["messages"] if msg["role"] == "system"]
+    data = dict(data, messages=[msg for msg in data["messages"] if msg["role"] != "system"])
+    if system_parts:
+        data["system"] = "\n\n".join(system_parts)
+    buffer = StreamBuffer(app)
+    usage = {}
+    async with session.post(url, headers=headers, json=data) as response:
+        response.raise_for_status()
+        async for sse_event in iter_sse(response):
+            event = sse_event.json()
+            event_type = event.get("type")
+            if event_type == "message_start":
+                usage = dict(event.get("message", {}).get("usage", {}))
+            elif event_type == "content_block_delta":
+                buffer.append(event.get("delta", {}).get("text"))
+            elif event_type == "message_delta":
+                # Cumulative counts for the whole message
+                usage.update(event.get("usage") or {})
+            elif event_type == "message_stop":
+                break
+            elif event_type == "error":
+                raise RuntimeError(event.get("error", {}).get("message", "Unknown streaming error"))
+    # input_tokens excludes prompt cache reads and writes, which are billed as input too
+    cache_read = usage.get("cache_read_input_tokens") or 0
+    input_tokens = usage.get("input_tokens")
+    if input_tokens is not None:
+        input_tokens += cache_read + (usage.get("cache_creation_input_tokens") or 0)
+    return buffer.getvalue(), {
+        "input_tokens": input_tokens,
+        "output_tokens": usage.get("output_tokens"),
+        "cached_tokens": cache_read,
+    }
+
+async def stream_gemini(app, session, url, headers, messages, max_tokens, settings):
+    """Stream a Gemini streamGenerateContent response over SSE. Returns (full_response, usage)."""
+    system_parts = [{"text": msg["content"]} for msg in messages if msg["role"] == "system"]
+    contents = [
+        {"role": "model" if msg["role"] == "assistant" else "user", "parts": [{"text": msg["content"]}]}
+        for msg in messages if msg["role"] != "system"
+    ]
+    data = {
+        "contents": contents,
+        "generationConfig": {
+            "maxOutputTokens": max_tokens,
+            "temperature": settings["temperature"],
+            "topP": settings["top_p"]
+        }
     }
-    rate = pricing.get(provider, {}).get(model_id, 0.01 / 1000)
-    return tokens * rate
\ No newline at end of file
+    if system_parts:
+        data["systemInstruction"] = {"parts": system_parts}
+    buffer = StreamBuffer(app)
+    usage = {}
+    async with session.post(url, headers=headers, json=data) as response:
+        response.raise_for_status()
+        async for sse_event in iter_sse(response):
+            chunk = sse_event.json()
+            # Every chunk carries cumulative usage; the last one is final
+            usage = chunk.get("usageMetadata", usage)
+            for candidate in chunk.get("candidates", [])[:1]:
+                for part in candidate.get("content", {}).get("parts", []):
+                    buffer.append(part.get("text"))
+    # Thinking tokens are billed as output; promptTokenCount includes cached content
+    output_tokens = usage.get("candidatesTokenCount")
+    if output_tokens is not None:
+        output_tokens += usage.get("thoughtsTokenCount") or 0
+    return buffer.getvalue(), {
+        "input_tokens": usage.get("promptTokenCount"),
+        "output_tokens": output_tokens,
+        "cached_tokens": usage.get("cachedContentTokenCount"),
+    }
\ No newline at end of file
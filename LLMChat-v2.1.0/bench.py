@@ -0,0 +1,338 @@
+"""
+Microbenchmarks for Voyeur Chat hot paths.
+
+Usage:
+    python bench.py            # run every benchmark
+    python bench.py sse        # run a single benchmark
+"""
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import aiosqlite
+
+import db
+import tokenizer
+
+from sse import SSEDecoder, ORJSON_AVAILABLE
+from palette import ModelIndex
+
+def _report(name, count, unit, elapsed):
+    print(f"{name:<40} {count / elapsed:>14,.0f} {unit}/sec  ({elapsed * 1000:.1f} ms)")
+
+def bench_sse(num_chunks=200_000, read_size=4096):
+    """Chunks/sec through the incremental SSE decoder versus the old per-line decode."""
+    chunk = {"id": "chatcmpl-1", "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": "token "}}]}
+    payload = b"".join(b"data: " + json.dumps(chunk).encode() + b"\n\n" for _ in range(num_chunks)) + b"data: [DONE]\n\n"
+    reads = [payload[i:i + read_size] for i in range(0, len(payload), read_size)]
+    print(f"SSE: {num_chunks:,} chunks in {len(reads):,} reads of {read_size} bytes (orjson: {ORJSON_AVAILABLE})")
+
+    start = time.perf_counter()
+    count = 0
+    for line in payload.splitlines():
+        if line:
+            decoded_line = line.decode("utf-8").strip()
+            if decoded_line.startswith("data:"):
+                body = decoded_line[5:].strip()
+                if body == "[DONE]":
+                    break
+                data = json.loads(body)
+                if data["choices"][0]["delta"].get("content"):
+                    count += 1
+    _report("per-line decode + json.loads", count, "chunks", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    count = 0
+    decoder = SSEDecoder()
+    for read in reads:
+        for event in decoder.feed(read):
+            if event.is_done:
+                break
+            if event.json()["choices"][0]["delta"].get("content"):
+                count += 1
+    _report("SSEDecoder", count, "chunks", time.perf_counter() - start)
+
+def bench_db(num_messages=2000, num_fetches=200):
+    """Message inserts/sec and fetch latency: connection per call versus the pooled connections."""
+    print(f"DB: {num_messages:,} message inserts, {num_fetches} transcript fetches")
+
+    async def per_call(db_path):
+        # The original pattern: a fresh connection (and thread) per call, default pragmas
+        async with aiosqlite.connect(db_path) as conn:
+            await conn.execute("INSERT INTO conversations (title) VALUES ('bench')")
+            await conn.commit()
+        start = time.perf_counter()
+        for i in range(num_messages):
+            async with aiosqlite.connect(db_path) as conn:
+                await conn.execute(
+                    "INSERT INTO messages (conversation_id, role, content, tokens, cost) VALUES (?, ?, ?, ?, ?)",
+                    (1, "user", f"message {i}", None, None)
+                )
+                await conn.commit()
+        _report("connect per call: insert", num_messages, "inserts", time.perf_counter() - start)
+        start = time.perf_counter()
+        for _ in range(num_fetches):
+            async with aiosqlite.connect(db_path) as conn:
+                conn.row_factory = aiosqlite.Row
+                cursor = await conn.execute("SELECT * FROM messages WHERE conversation_id = ? ORDER BY timestamp ASC", (1,))
+                await cursor.fetchall()
+        elapsed = time.perf_counter() - start
+        print(f"{'connect per call: fetch':<40} {elapsed / num_fetches * 1000:>14.2f} ms/fetch")
+
+    async def pooled(db_path):
+        await db.init_database(db_path)
+        conv_id = await db.create_conversation_in_db("bench", "", "")
+        start = time.perf_counter()
+        for i in range(num_messages):
+            await db.add_message_to_db(conv_id, "user", f"message {i}")
+        _report("pooled WAL connections: insert", num_messages, "inserts", time.perf_counter() - start)
+        start = time.perf_counter()
+        for i in range(num_messages):
+            db.queue_message(conv_id, "user", f"queued {i}")
+            if i % 20 == 19:
+                await asyncio.sleep(0)  # let the write-behind task run, as the UI would
+        await db.flush_writes()
+        _report("write-behind queue: insert", num_messages, "inserts", time.perf_counter() - start)
+        stats = db.write_queue_stats()
+        print(f"{'write-behind queue: commits':<40} {stats['commits']:>14,}        (avg {stats['avg_commit_ms']} ms, max {stats['max_commit_ms']} ms)")
+        start = time.perf_counter()
+        for _ in range(num_fetches):
+            await db.fetch_messages_from_db(conv_id)
+        elapsed = time.perf_counter() - start
+        print(f"{'pooled WAL connections: fetch':<40} {elapsed / num_fetches * 1000:>14.2f} ms/fetch")
+        await db.close_database()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before_path = os.path.join(tmp, "before.db")
+        asyncio.run(db.init_database(before_path))
+        asyncio.run(db.close_database())
+        conn = sqlite3.connect(before_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        asyncio.run(per_call(before_path))
+        asyncio.run(pooled(os.path.join(tmp, "after.db")))
+
+def bench_messages_scaling(num_messages=1_000_000, num_conversations=10_000, num_fetches=500):
+    """Transcript fetch latency on a synthetic large database, before and after the message index."""
+    print(f"Scaling: {num_messages:,} messages across {num_conversations:,} conversations")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "scale.db")
+        asyncio.run(db.init_database(db_path))
+        asyncio.run(db.close_database())
+        conn = sqlite3.connect(db_path)
+        conn.execute("DROP INDEX idx_messages_conversation")
+        conn.executemany("INSERT INTO conversations (id, title) VALUES (?, ?)", ((i, f"c{i}") for i in range(1, num_conversations + 1)))
+        conn.executemany(
+            "INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)",
+            ((i % num_conversations + 1, "user" if i % 2 else "assistant", f"message {i}") for i in range(num_messages))
+        )
+        conn.commit()
+        query = "SELECT * FROM messages WHERE conversation_id = ? ORDER BY id ASC"
+        targets = [i * 7919 % num_conversations + 1 for i in range(num_fetches)]
+        for label in ("no index (full table scan)", "idx_messages_conversation"):
+            if label == "idx_messages_conversation":
+                conn.execute("CREATE INDEX idx_messages_conversation ON messages (conversation_id, id)")
+            plan = conn.execute("EXPLAIN QUERY PLAN " + query, (1,)).fetchall()
+            fetches = num_fetches if label == "idx_messages_conversation" else max(1, num_fetches // 50)
+            start = time.perf_counter()
+            for conv_id in targets[:fetches]:
+                conn.execute(query, (conv_id,)).fetchall()
+            elapsed = time.perf_counter() - start
+            print(f"{label:<40} {elapsed / fetches * 1000:>14.3f} ms/fetch  plan: {plan[-1][-1]}")
+        conn.close()
+
+def bench_search(num_messages=300_000, num_conversations=3_000):
+    """Full-text search latency over a synthetic database."""
+    topics = ["python", "database", "streaming", "tkinter", "latency", "sqlite", "model", "token",
+              "anthropic", "gemini", "render", "window", "cache", "search", "message", "context"]
+    # Zipf-ish vocabulary: a few common topic words plus a long tail of rarer ones
+    vocabulary = topics + [f"w{i}" for i in range(20_000)]
+    rng = random.Random(42)
+    print(f"Search: {num_messages:,} messages across {num_conversations:,} conversations")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "search.db")
+        asyncio.run(db.init_database(db_path))
+        asyncio.run(db.close_database())
+        conn = sqlite3.connect(db_path)
+        conn.executemany("INSERT INTO conversations (id, title) VALUES (?, ?)", ((i, f"chat about {topics[i % 16]}") for i in range(1, num_conversations + 1)))
+        conn.executemany(
+            "INSERT INTO messages (conversation_id, role, content) VALUES (?, ?, ?)",
+            ((i % num_conversations + 1, "user", " ".join(vocabulary[min(int(rng.paretovariate(0.6)) - 1, len(vocabulary) - 1)] for _ in range(30)))
+             for i in range(num_messages))
+        )
+        conn.commit()
+        conn.close()
+
+        async def run():
+            await db.open_database(db_path)
+            for query in ["python", "stream", "sqlite latency", "w1234", "gem"]:
+                start = time.perf_counter()
+                results = await db.search_messages_in_db(query)
+                elapsed = time.perf_counter() - start
+                print(f"{'search ' + repr(query):<40} {elapsed * 1000:>14.2f} ms  ({len(results)} results)")
+            await db.close_database()
+        asyncio.run(run())
+
+def bench_transcript(counts=(100, 1_000, 10_000), num_scrolls=100, frame_per_message_limit=2_000):
+    """Transcript open and scroll time versus message count: a frame per message versus the virtualized view."""
+    import tkinter as tk
+    from tkinter import ttk
+    from transcript import TranscriptView, TranscriptItem
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Transcript: skipped, no display ({e})")
+        return
+    root.geometry("1200x900")
+    rng = random.Random(42)
+    words = ["python", "stream", "render", "widget", "latency", "canvas", "message", "token", "layout"]
+
+    def create_row(parent):
+        # The widgets the chat window builds for each message: a frame, a wrapped label and five buttons
+        row = ttk.Frame(parent)
+        row.label = ttk.Label(row, wraplength=900, justify=tk.LEFT, font=("TkDefaultFont", 18))
+        row.label.pack(side=tk.LEFT, anchor="w")
+        buttons = ttk.Frame(row)
+        buttons.pack(side=tk.RIGHT, anchor="e")
+        for text in ("▷", "📋", "↻", "👍", "👎"):
+            ttk.Button(buttons, text=text, width=1).pack(side=tk.LEFT, padx=3)
+        return row
+
+    def bind_row(row, item):
+        row.label.configure(text=f"{item.role.capitalize()}: {item.text}")
+
+    print(f"Transcript: open (render newest) and random-scroll time, {num_scrolls} scrolls")
+    for count in counts:
+        texts = [" ".join(rng.choice(words) for _ in range(rng.randint(5, 200))) for _ in range(count)]
+        if count <= frame_per_message_limit:
+            canvas = tk.Canvas(root)
+            canvas.pack(fill=tk.BOTH, expand=True)
+            frame = ttk.Frame(canvas)
+            canvas.create_window((0, 0), window=frame, anchor="nw")
+            start = time.perf_counter()
+            for index, text in enumerate(texts):
+                row = create_row(frame)
+                bind_row(row, TranscriptItem("user" if index % 2 else "assistant", text))
+                row.pack(fill=tk.X, padx=15, pady=10)
+            root.update_idletasks()
+            canvas.configure(scrollregion=canvas.bbox("all"))
+            canvas.yview_moveto(1.0)
+            root.update()
+            open_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            for _ in range(num_scrolls):
+                canvas.yview_moveto(rng.random())
+                root.update()
+            scroll_ms = (time.perf_counter() - start) * 1000 / num_scrolls
+            print(f"{f'frame per message, {count:,}':<40} {open_ms:>10.1f} ms open {scroll_ms:>10.2f} ms/scroll  ({count:,} rows)")
+            canvas.destroy()
+        else:
+            print(f"{f'frame per message, {count:,}':<40} skipped (over {frame_per_message_limit:,} messages)")
+
+        canvas = tk.Canvas(root)
+        canvas.pack(fill=tk.BOTH, expand=True)
+        root.update()
+        view = TranscriptView(canvas, create_row, bind_row, font=("TkDefaultFont", 18))
+        start = time.perf_counter()
+        view.extend([TranscriptItem("user" if index % 2 else "assistant", text) for index, text in enumerate(texts)])
+        view.scroll_to_end()
+        view.layout()
+        root.update()
+        open_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        for _ in range(num_scrolls):
+            canvas.yview_moveto(rng.random())
+            view.layout()
+            root.update()
+        scroll_ms = (time.perf_counter() - start) * 1000 / num_scrolls
+        print(f"{f'virtualized, {count:,}':<40} {open_ms:>10.1f} ms open {scroll_ms:>10.2f} ms/scroll  ({view.stats()['rows_created']} rows)")
+        canvas.destroy()
+    root.destroy()
+
+def bench_tokenizer(num_chars=8_000_000, message_chars=4_000):
+    """Token counting throughput on large texts: per-family heuristics, cold and memoized."""
+    # Prose and code from this project, repeated up to the target size
+    here = os.path.dirname(os.path.abspath(__file__))
+    corpus = "".join(open(os.path.join(here, name), encoding="utf-8").read() for name in sorted(os.listdir(here)) if name.endswith((".py", ".md")))
+    text = (corpus * (num_chars // len(corpus) + 1))[:num_chars]
+    messages = [text[i:i + message_chars] for i in range(0, len(text), message_chars)]
+    print(f"Tokenizer: {len(text):,} chars in {len(messages):,} messages")
+
+    start = time.perf_counter()
+    tokens = sum(len(message.split()) for message in messages)
+    _report(f"str.split ({tokens:,} words)", len(text), "chars", time.perf_counter() - start)
+
+    for model in ["Anthropic: claude-3-5-sonnet", "OpenAI: gpt-4o", "Mistral: mistral-large-latest"]:
+        name = tokenizer.tokenizer_for(model)
+        start = time.perf_counter()
+        tokens = sum(tokenizer._count(message, name) for message in messages)
+        _report(f"{name} ({tokens:,} tokens)", len(text), "chars", time.perf_counter() - start)
+
+    # Each message counted once cold, then again as every later prompt would
+    model = "Anthropic: claude-3-5-sonnet"
+    start = time.perf_counter()
+    for message in messages:
+        tokenizer.count_tokens(message, model)
+    _report("count_tokens, cold cache", len(text), "chars", time.perf_counter() - start)
+    start = time.perf_counter()
+    for message in messages:
+        tokenizer.count_tokens(message, model)
+    _report("count_tokens, memoized", len(text), "chars", time.perf_counter() - start)
+    print(f"cache: {tokenizer.token_cache_stats()}")
+
+def bench_palette(providers=(("HuggingFace", 12_000), ("OpenRouter", 3_000), ("Together", 200), ("Groq", 300)), num_rounds=20):
+    """Model palette index build time and per-keystroke search latency over a synthetic catalog."""
+    rng = random.Random(0)
+    owners = ["meta-llama", "mistralai", "Qwen", "google", "microsoft", "deepseek-ai", "openai", "anthropic"]
+    families = ["llama-3.1-8b-instruct", "mistral-7b-instruct", "qwen2.5-coder-32b", "gemma-2-9b-it",
+                "phi-3-mini-4k", "deepseek-r1-distill", "gpt-4o-mini", "claude-3-5-sonnet"]
+    groups = {
+        provider: [f"{rng.choice(owners)}/{rng.choice(families)}-v{i}" for i in range(count)]
+        for provider, count in providers
+    }
+    total = sum(len(models) for models in groups.values())
+    print(f"Palette: {total:,} models from {len(groups)} providers")
+
+    index = ModelIndex()
+    start = time.perf_counter()
+    index.set_models(groups)
+    print(f"{'build index':<40} {(time.perf_counter() - start) * 1000:>10.1f} ms")
+    changed = dict(groups, Groq=groups["Groq"] + ["llama-3.3-70b-versatile"])
+    start = time.perf_counter()
+    index.set_models(changed)
+    print(f"{'re-index one provider':<40} {(time.perf_counter() - start) * 1000:>10.1f} ms")
+
+    # Every prefix of each query, as typed
+    pinned = [f"Groq: {groups['Groq'][0]}", f"OpenRouter: {groups['OpenRouter'][0]}"]
+    for query in ["", "llama 8b", "qwen coder", "gpt4o", "mistrl instrct", "openrouter claude"]:
+        prefixes = [query[:i] for i in range(1, len(query) + 1)] or [""]
+        worst = 0.0
+        start = time.perf_counter()
+        for _ in range(num_rounds):
+            for prefix in prefixes:
+                results = index.search(prefix, pinned)
+                worst = max(worst, index.last_search_ms)
+        elapsed = time.perf_counter() - start
+        matches = sum(len(labels) for _, labels in results)
+        mean = elapsed * 1000 / (num_rounds * len(prefixes))
+        print(f"{repr(query) + f' ({matches:,} matches)':<40} {mean:>10.2f} ms mean  {worst:.2f} ms worst")
+
+BENCHMARKS = {
+    "sse": bench_sse,
+    "db": bench_db,
+    "scaling": bench_messages_scaling,
+    "search": bench_search,
+    "transcript": bench_transcript,
+    "tokenizer": bench_tokenizer,
+    "palette": bench_palette,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,56 @@
+import re
+import threading
+
+# What may follow a table entry in a model id for the entry to apply
+SEGMENT_SUFFIX = re.compile(r"(?:[-:@].*)?")  # another id segment: "gpt-4" covers "gpt-4-0613" but not "gpt-4.5-preview"
+VERSION_SUFFIX = re.compile(r"(?:-(?:\d+|v\d+|latest|preview|beta))*")  # only a date, snapshot or release tag
+
+def bare_id(model_id):
+    """A model id lowercased and without its owner, so "meta-llama/Llama-3.1-8B" and "llama-3.1-8b" match."""
+    return model_id.lower().rsplit("/", 1)[-1]
+
+def longest_prefix(table, key, suffix=None):
+    """The longest entry of table that key starts with, or None.
+
+    With suffix, a compiled pattern such as SEGMENT_SUFFIX, an entry only counts when the rest
+    of key matches it in full.
+    """
+    best = None
+    for prefix in table:
+        if key.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            if suffix is None or suffix.fullmatch(key, len(prefix)):
+                best = prefix
+    return best
+
+class CatalogOverlay:
+    """Per-model values taken from provider catalogs, such as prices or limits, to layer over a bundled table.
+
+    Values are kept by (provider, model_id), and also by bare model id so a model reached directly
+    can use an aggregator's listing of it. Safe to use from any thread.
+    """
+
+    def __init__(self):
+        self._by_provider = {}
+        self._by_model = {}
+        self._lock = threading.Lock()
+
+    def set(self, provider, values):
+        """Replace a provider's values, {model_id: value}, e.g. from a fresh listing or the saved copy."""
+        with self._lock:
+            for key in [key for key in self._by_provider if key[0] == provider]:
+                del self._by_provider[key]
+            for model_id, value in values.items():
+                self._by_provider[(provider, model_id)] = value
+            self._by_model.clear()
+            for (_, model_id), value in self._by_provider.items():
+                self._by_model.setdefault(bare_id(model_id), value)
+
+    def get(self, provider, model_id):
+        """The value from the provider's own listing of the model, or None."""
+        with self._lock:
+            return self._by_provider.get((provider, model_id))
+
+    def get_any(self, model_id):
+        """The value from any provider's listing of the same bare model id, or None."""
+        with self._lock:
+            return self._by_model.get(bare_id(model_id))
@@ -0,0 +1,56 @@
+import bisect
+from tokenizer import count_tokens
+
+# Tokens each message adds for its role and separators on top of its content
+MESSAGE_OVERHEAD_TOKENS = 4
+
+class ConversationLog(list):
+    """Prompt history as a list of {"role", "content"} dicts, append-only.
+
+    Each message is tokenized once, when it is appended, and a running prefix sum of the counts
+    is kept alongside, so the newest messages fitting a token budget are found by bisection
+    rather than by re-counting the history on every send.
+    """
+
+    def __init__(self, messages=(), count_tokens=count_tokens):
+        super().__init__()
+        self.count_tokens = count_tokens
+        self._prefix = [0]
+        self.extend(messages)
+
+    def append(self, message, tokens=None):
+        if tokens is None:
+            tokens = self.count_tokens(message["content"])
+        super().append(message)
+        self._prefix.append(self._prefix[-1] + tokens + MESSAGE_OVERHEAD_TOKENS)
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def clear(self):
+        super().clear()
+        self._prefix = [0]
+
+    @property
+    def total_tokens(self):
+        return self._prefix[-1]
+
+    def newest_within(self, budget, max_messages=None):
+        """The longest run of newest messages whose tokens fit in budget, at most max_messages long."""
+        start = bisect.bisect_left(self._prefix, self._prefix[-1] - budget)
+        if max_messages is not None:
+            start = max(start, len(self) - max_messages)
+        return self[start:]
+
+def pack_context(system_prompt, log, budget, max_messages=None):
+    """System prompt followed by the newest messages of log that fit in budget tokens.
+
+    The system prompt is always included, even if it alone exceeds the budget. A budget of None,
+    for a model whose context window is unknown, leaves only max_messages to limit the history.
+    """
+    system = {"role": "system", "content": system_prompt}
+    if budget is None:
+        return [system] + log.newest_within(log.total_tokens, max_messages)
+    remaining = budget - log.count_tokens(system_prompt) - MESSAGE_OVERHEAD_TOKENS
+    return [system] + log.newest_within(max(0, remaining), max_messages)
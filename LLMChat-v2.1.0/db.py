@@ -1,15 +1,395 @@
 import os
+import re
+import time
+import asyncio
+import threading
 import aiosqlite
 import sqlite3
+from contextlib import asynccontextmanager
 
 # Define the database directory and path
 DB_DIR = os.path.expanduser("~/.lightllm_chat")
 DB_PATH = os.path.join(DB_DIR, "voyeur_chat.db")
 
-async def init_database():
+# Connection tuning
+READER_POOL_SIZE = 3
+CACHE_SIZE_KB = 16384  # page cache per connection
+MMAP_SIZE = 256 * 1024 * 1024
+CACHED_STATEMENTS = 256  # prepared statements kept per connection
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    f"PRAGMA cache_size=-{CACHE_SIZE_KB}",
+    f"PRAGMA mmap_size={MMAP_SIZE}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+]
+
+# Schema upgrades applied in order on top of the base tables; PRAGMA user_version records the last one run
+MIGRATIONS = [
+    # 1: messages are read per conversation in insertion order; id is monotonic, timestamp has 1 s resolution
+    [
+        "CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, id)",
+    ],
+    # 2: full-text search over message content and conversation titles, kept in sync by triggers
+    [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, content='messages', content_rowid='id', tokenize='porter unicode61', prefix='2 3 4')",
+        """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END""",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(title, content='conversations', content_rowid='id', tokenize='porter unicode61', prefix='2 3 4')",
+        """CREATE TRIGGER IF NOT EXISTS conversations_fts_insert AFTER INSERT ON conversations BEGIN
+            INSERT INTO conversations_fts (rowid, title) VALUES (new.id, new.title);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS conversations_fts_delete AFTER DELETE ON conversations BEGIN
+            INSERT INTO conversations_fts (conversations_fts, rowid, title) VALUES ('delete', old.id, old.title);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS conversations_fts_update AFTER UPDATE OF title ON conversations BEGIN
+            INSERT INTO conversations_fts (conversations_fts, rowid, title) VALUES ('delete', old.id, old.title);
+            INSERT INTO conversations_fts (rowid, title) VALUES (new.id, new.title);
+        END""",
+        # Index rows that existed before the upgrade
+        "INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')",
+        "INSERT INTO conversations_fts (conversations_fts) VALUES ('rebuild')",
+    ],
+    # 3: per-conversation totals, last activity and last model kept current by triggers, so the chat list
+    # and search never aggregate messages; the chat list is paged with keyset cursors on (last_message_at, id)
+    [
+        "ALTER TABLE messages ADD COLUMN model TEXT",
+        """CREATE TABLE IF NOT EXISTS conversation_stats (
+            conversation_id INTEGER PRIMARY KEY,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            total_tokens INTEGER NOT NULL DEFAULT 0,
+            total_cost REAL NOT NULL DEFAULT 0,
+            last_message_at TIMESTAMP,
+            last_model TEXT,
+            FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
+        )""",
+        # An empty conversation counts as active since it was created
+        """INSERT OR REPLACE INTO conversation_stats
+            (conversation_id, message_count, total_tokens, total_cost, last_message_at, last_model)
+            SELECT c.id, COUNT(m.id), COALESCE(SUM(m.tokens), 0), COALESCE(SUM(m.cost), 0),
+                   COALESCE(MAX(m.timestamp), c.created_at), c.llm_model
+            FROM conversations c LEFT JOIN messages m ON m.conversation_id = c.id
+            GROUP BY c.id""",
+        "CREATE INDEX IF NOT EXISTS idx_conversation_stats_activity ON conversation_stats (last_message_at, conversation_id)",
+        """CREATE TRIGGER IF NOT EXISTS conversation_stats_create AFTER INSERT ON conversations BEGIN
+            INSERT OR IGNORE INTO conversation_stats (conversation_id, last_message_at, last_model)
+            VALUES (new.id, new.created_at, new.llm_model);
+        END""",
+        # Only replies carry the model that wrote them; user messages keep the last one
+        """CREATE TRIGGER IF NOT EXISTS conversation_stats_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO conversation_stats (conversation_id, message_count, total_tokens, total_cost, last_message_at, last_model)
+            VALUES (new.conversation_id, 1, COALESCE(new.tokens, 0), COALESCE(new.cost, 0), new.timestamp, new.model)
+            ON CONFLICT (conversation_id) DO UPDATE SET
+                message_count = message_count + 1,
+                total_tokens = total_tokens + excluded.total_tokens,
+                total_cost = total_cost + excluded.total_cost,
+                last_message_at = excluded.last_message_at,
+                last_model = COALESCE(excluded.last_model, last_model);
+        END""",
+        # The newest remaining message is found through idx_messages_conversation, not a scan
+        """CREATE TRIGGER IF NOT EXISTS conversation_stats_delete AFTER DELETE ON messages BEGIN
+            UPDATE conversation_stats SET
+                message_count = message_count - 1,
+                total_tokens = total_tokens - COALESCE(old.tokens, 0),
+                total_cost = total_cost - COALESCE(old.cost, 0),
+                last_message_at = COALESCE(
+                    (SELECT timestamp FROM messages WHERE conversation_id = old.conversation_id ORDER BY id DESC LIMIT 1),
+                    (SELECT created_at FROM conversations WHERE id = old.conversation_id))
+            WHERE conversation_id = old.conversation_id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS conversation_stats_update AFTER UPDATE OF tokens, cost ON messages BEGIN
+            UPDATE conversation_stats SET
+                total_tokens = total_tokens - COALESCE(old.tokens, 0) + COALESCE(new.tokens, 0),
+                total_cost = total_cost - COALESCE(old.cost, 0) + COALESCE(new.cost, 0)
+            WHERE conversation_id = new.conversation_id;
+        END""",
+    ],
+    # 4: usage of the request that produced each reply, and model prices saved from provider catalogs
+    [
+        "ALTER TABLE messages ADD COLUMN input_tokens INTEGER",
+        "ALTER TABLE messages ADD COLUMN output_tokens INTEGER",
+        """CREATE TABLE IF NOT EXISTS model_metadata (
+            provider TEXT NOT NULL,
+            model_id TEXT NOT NULL,
+            input_price REAL,
+            output_price REAL,
+            cached_input_price REAL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (provider, model_id)
+        )""",
+    ],
+    # 5: each provider's last model listing, so the model menu fills without waiting on the network
+    [
+        """CREATE TABLE IF NOT EXISTS model_catalog (
+            provider TEXT PRIMARY KEY,
+            models TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            etag TEXT,
+            last_modified TEXT
+        )""",
+    ],
+    # 6: model limits and capabilities from provider catalogs, saved with their prices
+    [
+        "ALTER TABLE model_metadata ADD COLUMN context_window INTEGER",
+        "ALTER TABLE model_metadata ADD COLUMN max_output_tokens INTEGER",
+        "ALTER TABLE model_metadata ADD COLUMN supports_streaming INTEGER",
+        "ALTER TABLE model_metadata ADD COLUMN supports_vision INTEGER",
+        "ALTER TABLE model_metadata ADD COLUMN supports_system_prompt INTEGER",
+    ],
+    # 7: opt-in cache of replies keyed by a hash of the exact request; evicted least recently used first
+    [
+        """CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            provider TEXT NOT NULL,
+            model_id TEXT NOT NULL,
+            response TEXT NOT NULL,
+            input_tokens INTEGER,
+            output_tokens INTEGER,
+            cost REAL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache(last_used)",
+    ],
+]
+
+CHAT_LIST_PAGE_SIZE = 100
+CHAT_LIST_COLUMNS = "c.id, c.title, s.last_message_at, s.last_model, s.message_count, s.total_tokens, s.total_cost"
+CHAT_LIST_FROM = "FROM conversation_stats s JOIN conversations c ON c.id = s.conversation_id"
+TRANSCRIPT_PAGE_SIZE = 50
+MAX_ROWID = 2 ** 63 - 1
+
+# Search snippets wrap matches in these control characters so the UI can highlight them
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+TITLE_MATCH_BOOST = 2.0
+SEARCH_RANK_WINDOW = 2000
+
+# Write-behind message inserts: rows queued from any thread share one commit per short window
+WRITE_BEHIND_DELAY = 0.05  # seconds a batch waits for more rows before committing
+WRITE_BEHIND_MAX_BATCH = 500
+
+# One writer and a small reader pool, opened once and kept for the life of the app
+_writer = None
+_write_lock = None
+_readers = None
+_open_lock = None
+
+_pending_writes = []
+_pending_lock = threading.Lock()
+_flush_lock = None
+_write_behind_loop = None
+_write_behind_wakeup = None
+_write_behind_task = None
+_write_stats = {"commits": 0, "rows": 0, "dropped": 0, "last_commit_ms": 0.0, "max_commit_ms": 0.0, "total_commit_ms": 0.0}
+
+INSERT_MESSAGE = (
+    "INSERT INTO messages (conversation_id, role, content, tokens, cost, input_tokens, output_tokens, model) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+async def _connect(db_path):
+    conn = await aiosqlite.connect(db_path, cached_statements=CACHED_STATEMENTS)
+    conn.row_factory = aiosqlite.Row
+    for pragma in PRAGMAS:
+        await conn.execute(pragma)
+    return conn
+
+async def open_database(db_path=DB_PATH):
+    """Open the shared writer connection and reader pool if they are not open yet."""
+    global _writer, _write_lock, _readers, _open_lock, _flush_lock
+    global _write_behind_loop, _write_behind_wakeup, _write_behind_task
+    if _open_lock is None:
+        _open_lock = asyncio.Lock()
+    async with _open_lock:
+        if _writer is not None:
+            return
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        writer = await _connect(db_path)
+        readers = asyncio.Queue()
+        for _ in range(READER_POOL_SIZE):
+            readers.put_nowait(await _connect(db_path))
+        _write_lock = asyncio.Lock()
+        _flush_lock = asyncio.Lock()
+        _readers = readers
+        _writer = writer
+        _write_behind_loop = asyncio.get_running_loop()
+        _write_behind_wakeup = asyncio.Event()
+        _write_behind_task = asyncio.create_task(_write_behind())
+        if _pending_writes:
+            _write_behind_wakeup.set()
+
+async def close_database():
+    """Commit queued messages and close every pooled connection; the WAL is checkpointed when the last one closes."""
+    global _writer, _readers, _write_behind_loop, _write_behind_task
+    if _writer is None:
+        return
+    await flush_writes()
+    _write_behind_task.cancel()
+    _write_behind_task = None
+    _write_behind_loop = None
+    async with _write_lock:
+        while not _readers.empty():
+            await _readers.get_nowait().close()
+        await _writer.close()
+        _writer = None
+        _readers = None
+
+@asynccontextmanager
+async def _write():
+    """Exclusive use of the writer connection; commits on success, rolls back on error."""
+    if _writer is None:
+        await open_database()
+    async with _write_lock:
+        try:
+            yield _writer
+            await _writer.commit()
+        except Exception:
+            await _writer.rollback()
+            raise
+
+def queue_message(conversation_id, role, content, tokens=None, cost=None, input_tokens=None, output_tokens=None, model=None):
+    """Queue a message insert for the next group commit. Safe to call from any thread.
+
+    tokens is the size of the message itself; input_tokens and output_tokens are the usage of the
+    request that produced a reply, cost is what that request was billed, and model the
+    "Provider: model_id" that wrote it.
+    """
+    with _pending_lock:
+        _pending_writes.append((conversation_id, role, content, tokens, cost, input_tokens, output_tokens, model))
+    _wake_writer()
+
+def _wake_writer():
+    loop, wakeup = _write_behind_loop, _write_behind_wakeup
+    if loop is None:
+        return  # picked up when the database is opened
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        wakeup.set()
+    else:
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            pass  # loop already closed; close_database flushed what it could
+
+async def _write_behind():
+    while True:
+        await _write_behind_wakeup.wait()
+        # Let rows that arrive right behind the first one share its commit
+        await asyncio.sleep(WRITE_BEHIND_DELAY)
+        _write_behind_wakeup.clear()
+        try:
+            await flush_writes()
+        except sqlite3.OperationalError:
+            # Busy or locked: the batch went back on the queue; try again shortly
+            await asyncio.sleep(1)
+            _write_behind_wakeup.set()
+
+async def _insert_batch(batch):
+    """Insert queued rows in one commit and return how many were saved.
+
+    Rows the schema rejects, such as a message for a conversation deleted since it was queued,
+    are dropped so they cannot hold up the rest; OperationalError (busy, locked, disk) is raised.
+    """
+    try:
+        async with _write() as db:
+            await db.executemany(INSERT_MESSAGE, batch)
+        return len(batch)
+    except sqlite3.OperationalError:
+        raise
+    except sqlite3.Error:
+        pass
+    inserted = 0
+    async with _write() as db:
+        for row in batch:
+            try:
+                await db.execute(INSERT_MESSAGE, row)
+                inserted += 1
+            except sqlite3.OperationalError:
+                raise
+            except sqlite3.Error as e:
+                _write_stats["dropped"] += 1
+                print(f"Dropped queued message for conversation {row[0]}: {e}")
+    return inserted
+
+async def flush_writes():
+    """Commit every queued message now, in batches of at most WRITE_BEHIND_MAX_BATCH rows.
+
+    Raises OperationalError with the failed batch back on the queue when the database is busy.
+    """
+    if _flush_lock is None:
+        await open_database()
+    async with _flush_lock:
+        while True:
+            with _pending_lock:
+                batch = _pending_writes[:WRITE_BEHIND_MAX_BATCH]
+                del _pending_writes[:len(batch)]
+            if not batch:
+                return
+            start = time.perf_counter()
+            try:
+                inserted = await _insert_batch(batch)
+            except sqlite3.OperationalError:
+                with _pending_lock:
+                    _pending_writes[:0] = batch
+                raise
+            elapsed = (time.perf_counter() - start) * 1000
+            _write_stats["commits"] += 1
+            _write_stats["rows"] += inserted
+            _write_stats["last_commit_ms"] = elapsed
+            _write_stats["max_commit_ms"] = max(_write_stats["max_commit_ms"], elapsed)
+            _write_stats["total_commit_ms"] += elapsed
+
+def write_queue_stats():
+    """Queue depth and group commit latency for the write-behind message queue."""
+    with _pending_lock:
+        depth = len(_pending_writes)
+    commits = _write_stats["commits"]
+    return {
+        "depth": depth,
+        "commits": commits,
+        "rows": _write_stats["rows"],
+        "dropped": _write_stats["dropped"],
+        "last_commit_ms": round(_write_stats["last_commit_ms"], 2),
+        "avg_commit_ms": round(_write_stats["total_commit_ms"] / commits, 2) if commits else 0.0,
+        "max_commit_ms": round(_write_stats["max_commit_ms"], 2),
+    }
+
+@asynccontextmanager
+async def _read():
+    """Borrow a reader connection from the pool, after committing any queued messages."""
+    if _writer is None:
+        await open_database()
+    if _pending_writes:
+        try:
+            await flush_writes()
+        except sqlite3.OperationalError:
+            pass  # the write-behind task retries; read what is committed meanwhile
+    conn = await _readers.get()
+    try:
+        yield conn
+    finally:
+        _readers.put_nowait(conn)
+
+async def init_database(db_path=DB_PATH):
     """Initialize the SQLite database and create necessary tables."""
-    os.makedirs(DB_DIR, exist_ok=True)
-    async with aiosqlite.connect(DB_PATH) as db:
+    await open_database(db_path)
+    async with _write() as db:
         await db.execute("""
             CREATE TABLE IF NOT EXISTS conversations (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -38,74 +418,320 @@ async def init_database():
                 FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
             )
         """)
-        await db.commit()
+        await _migrate(db)
+
+async def _migrate(db):
+    """Bring an existing database up to the latest schema in place."""
+    cursor = await db.execute("PRAGMA user_version")
+    version = (await cursor.fetchone())[0]
+    for number, statements in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        for statement in statements:
+            await db.execute(statement)
+        await db.execute(f"PRAGMA user_version = {number}")
 
 async def create_conversation_in_db(title, model, system_prompt):
     """Create a new conversation in the database and return its ID."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         cursor = await db.execute(
             "INSERT INTO conversations (title, llm_model, system_prompt) VALUES (?, ?, ?)",
             (title, model, system_prompt)
         )
-        await db.commit()
         return cursor.lastrowid
 
 async def add_message_to_db(conversation_id, role, content, tokens=None, cost=None):
     """Add a message to a conversation in the database."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute(
             "INSERT INTO messages (conversation_id, role, content, tokens, cost) VALUES (?, ?, ?, ?, ?)",
             (conversation_id, role, content, tokens, cost)
         )
-        await db.commit()
 
-async def fetch_conversations_from_db():
-    """Fetch all conversations from the database."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute("SELECT * FROM conversations ORDER BY created_at DESC")
+async def fetch_conversation_page_from_db(after=None, limit=CHAT_LIST_PAGE_SIZE):
+    """Fetch one page of the chat list, most recently active first.
+
+    `after` is the (last_message_at, id) cursor of the last row already shown; pass None for the
+    first page. Only the columns the sidebar displays are selected, all but the title read from
+    conversation_stats, which also orders the list.
+    """
+    async with _read() as db:
+        if after is None:
+            cursor = await db.execute(
+                f"SELECT {CHAT_LIST_COLUMNS} {CHAT_LIST_FROM} ORDER BY s.last_message_at DESC, s.conversation_id DESC LIMIT ?",
+                (limit,)
+            )
+        else:
+            cursor = await db.execute(
+                f"""
+                SELECT {CHAT_LIST_COLUMNS} {CHAT_LIST_FROM}
+                WHERE (s.last_message_at, s.conversation_id) < (?, ?)
+                ORDER BY s.last_message_at DESC, s.conversation_id DESC LIMIT ?
+                """,
+                (*after, limit)
+            )
+        return await cursor.fetchall()
+
+async def fetch_conversations_through_cursor_from_db(cursor_row):
+    """Fetch every chat list row from the newest down to and including the (last_message_at, id) cursor."""
+    async with _read() as db:
+        cursor = await db.execute(
+            f"""
+            SELECT {CHAT_LIST_COLUMNS} {CHAT_LIST_FROM}
+            WHERE (s.last_message_at, s.conversation_id) >= (?, ?)
+            ORDER BY s.last_message_at DESC, s.conversation_id DESC
+            """,
+            tuple(cursor_row)
+        )
+        return await cursor.fetchall()
+
+async def fetch_conversation_from_db(conversation_id):
+    """Fetch a single conversation row, or None if it does not exist."""
+    async with _read() as db:
+        cursor = await db.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,))
+        return await cursor.fetchone()
+
+async def fetch_messages_from_db(conversation_id, from_id=None):
+    """Fetch the messages of a conversation in order, optionally starting at message from_id."""
+    async with _read() as db:
+        cursor = await db.execute(
+            "SELECT * FROM messages WHERE conversation_id = ? AND id >= ? ORDER BY id ASC",
+            (conversation_id, from_id or 0)
+        )
         return await cursor.fetchall()
 
-async def fetch_messages_from_db(conversation_id):
-    """Fetch all messages for a given conversation from the database."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+async def fetch_message_window_from_db(conversation_id, before_id=None, limit=TRANSCRIPT_PAGE_SIZE):
+    """Fetch the newest `limit` messages older than before_id (newest overall if None), oldest first."""
+    async with _read() as db:
         cursor = await db.execute(
-            "SELECT * FROM messages WHERE conversation_id = ? ORDER BY timestamp ASC",
+            """
+            SELECT * FROM (
+                SELECT * FROM messages WHERE conversation_id = ? AND id < ? ORDER BY id DESC LIMIT ?
+            ) ORDER BY id ASC
+            """,
+            (conversation_id, before_id if before_id is not None else MAX_ROWID, limit)
+        )
+        return await cursor.fetchall()
+
+async def fetch_message_context_from_db(conversation_id):
+    """Fetch id, role, content and token count of every message in a conversation, for assembling the prompt."""
+    async with _read() as db:
+        cursor = await db.execute(
+            "SELECT id, role, content, tokens FROM messages WHERE conversation_id = ? ORDER BY id ASC",
             (conversation_id,)
         )
         return await cursor.fetchall()
 
+MODEL_METADATA_COLUMNS = (
+    "input_price, output_price, cached_input_price, "
+    "context_window, max_output_tokens, supports_streaming, supports_vision, supports_system_prompt"
+)
+
+async def save_model_metadata_in_db(provider, prices, limits):
+    """Replace the saved catalog metadata for a provider.
+
+    prices maps model_id to (input, output, cached input); limits maps model_id to (context window,
+    max output tokens, streaming, vision, system prompt). Either may lack a model the other has.
+    """
+    rows = [
+        (provider, model_id, *prices.get(model_id, (None,) * 3), *limits.get(model_id, (None,) * 5))
+        for model_id in dict.fromkeys([*prices, *limits])
+    ]
+    async with _write() as db:
+        await db.execute("DELETE FROM model_metadata WHERE provider = ?", (provider,))
+        await db.executemany(
+            f"INSERT INTO model_metadata (provider, model_id, {MODEL_METADATA_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+async def fetch_model_metadata_from_db():
+    """Fetch every saved catalog price and limit."""
+    async with _read() as db:
+        cursor = await db.execute(f"SELECT provider, model_id, {MODEL_METADATA_COLUMNS} FROM model_metadata")
+        return await cursor.fetchall()
+
+async def fetch_model_catalog_from_db():
+    """Fetch every saved provider model listing."""
+    async with _read() as db:
+        cursor = await db.execute("SELECT provider, models, fetched_at, etag, last_modified FROM model_catalog")
+        return await cursor.fetchall()
+
+async def save_model_catalog_in_db(provider, models, fetched_at, etag=None, last_modified=None):
+    """Save a provider's model listing (JSON text) with the validators to revalidate it later."""
+    async with _write() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO model_catalog (provider, models, fetched_at, etag, last_modified) VALUES (?, ?, ?, ?, ?)",
+            (provider, models, fetched_at, etag, last_modified)
+        )
+
+async def touch_model_catalog_in_db(provider, fetched_at):
+    """Mark a saved model listing as confirmed current at fetched_at."""
+    async with _write() as db:
+        await db.execute("UPDATE model_catalog SET fetched_at = ? WHERE provider = ?", (fetched_at, provider))
+
+async def fetch_cached_response_from_db(key, created_after):
+    """The cached reply for a request key, marked as just used, or None if there is none newer than created_after."""
+    async with _write() as db:
+        cursor = await db.execute(
+            "SELECT response, input_tokens, output_tokens, cost, created_at FROM response_cache WHERE key = ? AND created_at > ?",
+            (key, created_after)
+        )
+        row = await cursor.fetchone()
+        if row is not None:
+            await db.execute("UPDATE response_cache SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        return row
+
+async def save_cached_response_in_db(key, provider, model_id, response, input_tokens, output_tokens, cost, created_after, max_bytes):
+    """Cache a reply under its request key, then drop entries older than created_after and the least
+    recently used ones beyond max_bytes of replies in total."""
+    now = time.time()
+    async with _write() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO response_cache "
+            "(key, provider, model_id, response, input_tokens, output_tokens, cost, size, created_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, provider, model_id, response, input_tokens, output_tokens, cost, len(response.encode("utf-8")), now, now)
+        )
+        await db.execute("DELETE FROM response_cache WHERE created_at <= ?", (created_after,))
+        await db.execute("""
+            DELETE FROM response_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS kept FROM response_cache
+                ) WHERE kept > ?
+            )""", (max_bytes,))
+
+async def fetch_response_cache_stats_from_db():
+    """Number of cached replies and their total size in bytes."""
+    async with _read() as db:
+        cursor = await db.execute("SELECT COUNT(*) AS entries, COALESCE(SUM(size), 0) AS size FROM response_cache")
+        return await cursor.fetchone()
+
+async def clear_response_cache_in_db():
+    """Delete every cached reply."""
+    async with _write() as db:
+        await db.execute("DELETE FROM response_cache")
+
+async def update_message_tokens_in_db(counts):
+    """Store token counts for saved messages; counts is a list of (tokens, message_id) pairs."""
+    async with _write() as db:
+        await db.executemany("UPDATE messages SET tokens = ? WHERE id = ?", counts)
+
+SNIPPET_WORDS = 12
+
+def _fts_query(terms):
+    """Build a safe FTS5 query; only the word still being typed is matched as a prefix."""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def _snippet(content, terms):
+    """Excerpt of content around the first matching term, matches wrapped in MATCH_START/MATCH_END."""
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(term) for term in terms) + r")\w*", re.IGNORECASE)
+    first = pattern.search(content)
+    words = content.split()
+    start_word = len(content[:first.start()].split()) if first else 0
+    start_word = max(0, start_word - SNIPPET_WORDS // 3)
+    excerpt = " ".join(words[start_word:start_word + SNIPPET_WORDS])
+    excerpt = pattern.sub(lambda match: f"{MATCH_START}{match.group(0)}{MATCH_END}", excerpt)
+    prefix = "…" if start_word > 0 else ""
+    suffix = "…" if start_word + SNIPPET_WORDS < len(words) else ""
+    return prefix + excerpt + suffix
+
+async def search_messages_in_db(text, limit=50):
+    """Full-text search over message content and conversation titles, best matches first.
+
+    Returns dicts with conversation_id, message_id (None for title matches), title, role, a
+    snippet whose matches are wrapped in MATCH_START/MATCH_END, and the conversation's
+    last_message_at, last_model, message_count, total_tokens and total_cost.
+    """
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return []
+    query = _fts_query(terms)
+    async with _read() as db:
+        # Rank only the newest SEARCH_RANK_WINDOW matches (FTS5 walks rowids newest-first cheaply),
+        # then limit before joining, so the joins only run for the rows shown
+        cursor = await db.execute(
+            """
+            SELECT m.conversation_id, m.id AS message_id, c.title, m.role, m.content, top.rank,
+                   s.last_message_at, s.last_model, s.message_count, s.total_tokens, s.total_cost
+            FROM (
+                SELECT rowid, rank FROM (
+                    SELECT rowid, rank FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rowid DESC LIMIT ?
+                ) ORDER BY rank LIMIT ?
+            ) AS top
+            JOIN messages m ON m.id = top.rowid
+            JOIN conversations c ON c.id = m.conversation_id
+            LEFT JOIN conversation_stats s ON s.conversation_id = c.id
+            ORDER BY top.rank
+            """,
+            (query, SEARCH_RANK_WINDOW, limit)
+        )
+        message_rows = await cursor.fetchall()
+        cursor = await db.execute(
+            """
+            SELECT c.id AS conversation_id, NULL AS message_id, c.title, NULL AS role, c.title AS content,
+                   conversations_fts.rank * ? AS rank,
+                   s.last_message_at, s.last_model, s.message_count, s.total_tokens, s.total_cost
+            FROM conversations_fts
+            JOIN conversations c ON c.id = conversations_fts.rowid
+            LEFT JOIN conversation_stats s ON s.conversation_id = c.id
+            WHERE conversations_fts MATCH ?
+            ORDER BY conversations_fts.rank LIMIT ?
+            """,
+            (TITLE_MATCH_BOOST, query, limit)
+        )
+        title_rows = await cursor.fetchall()
+    # bm25 is lower-is-better; equally relevant hits list the most recently active conversation first
+    results = [dict(row) for row in message_rows + title_rows]
+    results.sort(key=lambda row: row["last_message_at"] or "", reverse=True)
+    results.sort(key=lambda row: row["rank"])
+    results = results[:limit]
+    for result in results:
+        result["snippet"] = _snippet(result.pop("content"), terms)
+    return results
+
 async def update_conversation_title_in_db(conversation_id, new_title):
     """Update the title of a conversation in the database."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute(
             "UPDATE conversations SET title = ? WHERE id = ?",
             (new_title, conversation_id)
         )
-        await db.commit()
+
+async def update_conversation_model_in_db(conversation_id, model):
+    """Update the model used by a conversation."""
+    async with _write() as db:
+        await db.execute(
+            "UPDATE conversations SET llm_model = ? WHERE id = ?",
+            (model, conversation_id)
+        )
 
 async def delete_conversation_in_db(conversation_id):
-    """Delete a conversation and its messages from the database."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
-        await db.commit()
+    """Delete a conversation and its messages from the database, including messages still queued for it."""
+    if _flush_lock is None:
+        await open_database()
+    # Holding the flush lock waits out a batch in flight, which the delete then cascades to
+    async with _flush_lock:
+        with _pending_lock:
+            _pending_writes[:] = [row for row in _pending_writes if row[0] != conversation_id]
+        async with _write() as db:
+            await db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
 
 async def save_draft(conversation_id, content):
     """Save a draft message for a conversation."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _write() as db:
         await db.execute(
             "INSERT OR REPLACE INTO drafts (conversation_id, content) VALUES (?, ?)",
             (conversation_id, content)
         )
-        await db.commit()
 
 async def load_draft(conversation_id):
     """Load a draft message for a conversation."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with _read() as db:
         cursor = await db.execute(
             "SELECT content FROM drafts WHERE conversation_id = ?",
             (conversation_id,)
         )
         result = await cursor.fetchone()
-        return result[0] if result else None
\ No newline at end of file
+        return result[0] if result else None
@@ -0,0 +1,173 @@
+from catalog import SEGMENT_SUFFIX, CatalogOverlay, bare_id, longest_prefix
+
+# (context window, max output tokens) by model id prefix, matched at an id segment boundary; the
+# longest matching prefix wins and None means the output is only bounded by the context window.
+# Limits from provider catalogs (OpenRouter, Together, Google, Groq, Mistral) take precedence over these.
+MODEL_LIMITS = {
+    "gpt-4o": (128000, 16384),
+    "chatgpt-4o": (128000, 16384),
+    "gpt-4.1": (1047576, 32768),
+    "gpt-4-turbo": (128000, 4096),
+    "gpt-4": (8192, 8192),
+    "gpt-4-32k": (32768, 8192),
+    "gpt-3.5-turbo": (16385, 4096),
+    "o1": (200000, 100000),
+    "o1-mini": (128000, 65536),
+    "o1-preview": (128000, 32768),
+    "o3": (200000, 100000),
+    "o4-mini": (200000, 100000),
+    "claude": (200000, 4096),
+    "claude-3-5-sonnet": (200000, 8192),
+    "claude-3-5-haiku": (200000, 8192),
+    "claude-3-7-sonnet": (200000, 64000),
+    "claude-sonnet-4": (200000, 64000),
+    "claude-opus-4": (200000, 32000),
+    "gemini-1.5-pro": (2097152, 8192),
+    "gemini": (1048576, 8192),
+    "gemini-2.5": (1048576, 65536),
+    "grok": (131072, None),
+    "llama-3.1": (131072, None),
+    "llama-3": (8192, None),
+    "llama-3-sonar": (32768, None),
+    "mixtral": (32768, None),
+    "mistral": (32768, None),
+    "deepseek": (65536, 8192),
+}
+
+# Model id prefixes, matched the same way, that accept image input
+VISION_MODELS = (
+    "gpt-4o", "chatgpt-4o", "gpt-4.1", "gpt-4-turbo", "o1", "o3", "o4", "claude-3", "claude-sonnet-4",
+    "claude-opus-4", "gemini", "grok-2-vision", "llama-3.2-11b-vision", "llama-3.2-90b-vision", "pixtral", "llava",
+)
+# Model id prefixes that reject a system message; their system prompt is sent as part of the first user message
+NO_SYSTEM_PROMPT_MODELS = ("o1-mini", "o1-preview", "gemma")
+
+class ModelInfo:
+    """What is known about one model: token limits and the request features it accepts.
+
+    context_window is None when no source knows it, and max_output_tokens is None when only the
+    context window bounds the reply. The capability flags are True unless a catalog or the bundled
+    tables say otherwise.
+    """
+    __slots__ = ("context_window", "max_output_tokens", "streaming", "vision", "system_prompt")
+
+    def __init__(self, context_window=None, max_output_tokens=None, streaming=True, vision=False, system_prompt=True):
+        self.context_window = context_window
+        self.max_output_tokens = max_output_tokens
+        self.streaming = streaming
+        self.vision = vision
+        self.system_prompt = system_prompt
+
+    def __repr__(self):
+        return (f"ModelInfo(context_window={self.context_window!r}, max_output_tokens={self.max_output_tokens!r}, "
+                f"streaming={self.streaming!r}, vision={self.vision!r}, system_prompt={self.system_prompt!r})")
+
+# Catalog metadata as (context window, max output tokens, streaming, vision, system prompt) with None
+# where the catalog says nothing
+_catalog_limits = CatalogOverlay()
+
+def _tokens(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+def catalog_limits(provider, models):
+    """Limits and capabilities from a provider's raw model listing, as {model_id: (context window,
+    max output tokens, streaming, vision, system prompt)} with None for whatever the listing omits.
+
+    OpenRouter gives context_length, top_provider.max_completion_tokens and input modalities;
+    Together context_length; Google input/output token limits and whether generateContent is offered; Groq
+    context_window and max_completion_tokens; Mistral max_context_length and capabilities.
+    """
+    limits = {}
+    for model in models:
+        if not isinstance(model, dict):
+            continue
+        model_id = model.get("id", model.get("name"))
+        if not model_id:
+            continue
+        if provider == "OpenRouter":
+            modalities = (model.get("architecture") or {}).get("input_modalities") or []
+            entry = (_tokens(model.get("context_length")),
+                     _tokens((model.get("top_provider") or {}).get("max_completion_tokens")),
+                     None, "image" in modalities if modalities else None, None)
+        elif provider == "Together":
+            entry = (_tokens(model.get("context_length")), None, None, None, None)
+        elif provider == "Google":
+            # Streaming is not listed separately: every model that can generateContent can stream it
+            methods = model.get("supportedGenerationMethods")
+            entry = (_tokens(model.get("inputTokenLimit")), _tokens(model.get("outputTokenLimit")),
+                     "generateContent" in methods if methods is not None else None, None, None)
+        elif provider == "Groq":
+            entry = (_tokens(model.get("context_window")), _tokens(model.get("max_completion_tokens")), None, None, None)
+        elif provider == "Mistral":
+            capabilities = model.get("capabilities") or {}
+            entry = (_tokens(model.get("max_context_length")), None, None, capabilities.get("vision"), None)
+        else:
+            continue
+        if any(value is not None for value in entry):
+            limits[model_id] = entry
+    return limits
+
+def set_catalog_limits(provider, limits):
+    """Replace the catalog limits for a provider, e.g. from a fresh listing or the saved copy."""
+    _catalog_limits.set(provider, limits)
+
+def model_info(provider, model_id):
+    """Everything known about a model, from its provider's catalog, then the bundled tables,
+    then another catalog's listing of the same model; the capability defaults fill in the rest."""
+    bare = bare_id(model_id)
+    prefix = longest_prefix(MODEL_LIMITS, bare, SEGMENT_SUFFIX)
+    bundled = MODEL_LIMITS[prefix] if prefix else (None, None)
+    sources = [
+        _catalog_limits.get(provider, model_id),
+        (
+            *bundled, None,
+            True if longest_prefix(VISION_MODELS, bare, SEGMENT_SUFFIX) else None,
+            False if longest_prefix(NO_SYSTEM_PROMPT_MODELS, bare, SEGMENT_SUFFIX) else None,
+        ),
+        _catalog_limits.get_any(model_id),
+    ]
+    fields = [None] * 5
+    for entry in sources:
+        if entry:
+            fields = [known if known is not None else new for known, new in zip(fields, entry)]
+    context_window, max_output_tokens, streaming, vision, system_prompt = fields
+    return ModelInfo(
+        context_window,
+        max_output_tokens,
+        streaming is not False,
+        bool(vision),
+        system_prompt is not False,
+    )
+
+def fit_max_tokens(info, requested, prompt_tokens=0):
+    """The max_tokens to send: requested, lowered to the model's output limit and to what its
+    context window leaves after the prompt. Returns (max_tokens, reason) with reason None when
+    requested was sent as is; max_tokens below 1 means the prompt alone fills the window.
+    An unknown context window is left to the provider to enforce.
+    """
+    max_tokens, reason = requested, None
+    if info.max_output_tokens is not None and max_tokens > info.max_output_tokens:
+        max_tokens, reason = info.max_output_tokens, f"the model's output limit is {info.max_output_tokens:,} tokens"
+    if info.context_window is None:
+        return max_tokens, reason
+    room = info.context_window - prompt_tokens
+    if max_tokens > room:
+        max_tokens, reason = room, f"{prompt_tokens:,} prompt tokens leave {max(room, 0):,} of the {info.context_window:,}-token context window"
+    return max_tokens, reason
+
+def describe_model(info):
+    """Short summary of a model's limits and capabilities for the status window."""
+    parts = [f"{info.context_window:,}-token context" if info.context_window is not None else "unknown context window"]
+    if info.max_output_tokens is not None:
+        parts.append(f"up to {info.max_output_tokens:,} output tokens")
+    if info.vision:
+        parts.append("vision")
+    if not info.streaming:
+        parts.append("no streaming")
+    if not info.system_prompt:
+        parts.append("no system prompt")
+    return ", ".join(parts)
@@ -0,0 +1,294 @@
+import bisect
+import math
+import re
+import time
+import tkinter as tk
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_SEPARATOR_RE = re.compile(r"[^a-z0-9]+")
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class _ProviderIndex:
+    """Search structures over one provider's model ids: sorted word tokens for prefix lookups
+    and trigram posting lists for substring and typo-tolerant matches. Trigrams are taken with
+    separators removed, so "gpt4o" finds "gpt-4o"."""
+
+    def __init__(self, provider, model_ids):
+        self.provider = provider
+        self.name = provider.lower()
+        self.ids = list(model_ids)
+        self.labels = [f"{provider}: {model_id}" for model_id in self.ids]
+        self.positions = {label: i for i, label in enumerate(self.labels)}
+        self.lower = [model_id.lower() for model_id in self.ids]
+        self.compact = [_SEPARATOR_RE.sub("", text) for text in self.lower]
+        tokens = []
+        postings = {}
+        for i, text in enumerate(self.lower):
+            tokens.append((text, i))
+            tokens.extend((token, i) for token in _TOKEN_RE.findall(text))
+            for trigram in _trigrams(self.compact[i]):
+                postings.setdefault(trigram, []).append(i)
+        tokens.sort()
+        self.tokens = [token for token, _ in tokens]
+        self.token_ids = [i for _, i in tokens]
+        # Sets, so votes from common trigrams are only counted for ids the rare ones let through
+        self.postings = {trigram: frozenset(ids) for trigram, ids in postings.items()}
+
+    def _prefix_matches(self, term):
+        start = bisect.bisect_left(self.tokens, term)
+        end = bisect.bisect_left(self.tokens, term + "\uffff", start)
+        return set(self.token_ids[start:end])
+
+    def _term_matches(self, term, within=None):
+        """{index: score} for the ids matching one query term, only among the ids in within if given."""
+        prefixed = self._prefix_matches(term)
+        if within is not None:
+            prefixed &= within
+        matches = dict.fromkeys(prefixed, 2.0)
+        compact = _SEPARATOR_RE.sub("", term)
+        if len(compact) >= 3:
+            trigrams = _trigrams(compact)
+            # Substrings share every trigram; a typo or two still shares most of them
+            needed = max(1, math.ceil(len(trigrams) * ModelIndex.FUZZY_THRESHOLD))
+            # An id in none of the rarest len - needed + 1 lists cannot reach needed votes from the
+            # rest, so only those lists are read in full and the common ones are intersected
+            lists = [self.postings.get(trigram, frozenset()) for trigram in trigrams]
+            if within is not None:
+                lists = [ids.intersection(within) for ids in lists]
+            lists.sort(key=len)
+            cut = len(lists) - needed + 1
+            votes = Counter()
+            for ids in lists[:cut]:
+                votes.update(ids)
+            candidates = votes.keys()
+            for ids in lists[cut:]:
+                votes.update(ids.intersection(candidates))
+            total = len(trigrams)
+            for i, count in votes.items():
+                if count >= needed and i not in matches:
+                    # Only an id holding every trigram can contain the term
+                    matches[i] = 1.5 if count == total and compact in self.compact[i] else count / total
+        # An id starting with the term is itself one of its prefix matches
+        for i in prefixed:
+            if self.lower[i].startswith(term):
+                matches[i] = 3.0
+        return matches
+
+    def search(self, terms):
+        """{i: score} for the ids matching every term, or None when every id matches (no terms,
+        or only terms naming the provider)."""
+        scores = None
+        for term in terms:
+            if self.name.startswith(term):
+                continue
+            # Later terms only need checking against the ids every earlier term matched
+            matches = self._term_matches(term, None if scores is None else scores.keys())
+            if scores is None:
+                scores = matches
+            else:
+                scores = {i: score + matches[i] for i, score in scores.items() if i in matches}
+            if not scores:
+                return {}
+        if scores is None:
+            return None
+        # Among equal matches prefer the shorter, more canonical id
+        return {i: score - len(self.ids[i]) / 1000 for i, score in scores.items()}
+
+class ModelIndex:
+    """In-memory search index over "Provider: model_id" labels, rebuilt per provider as listings arrive.
+
+    set_models builds the new per-provider indexes aside and swaps them in with one assignment,
+    so it can run on the event loop thread while the Tk thread searches.
+    """
+    FUZZY_THRESHOLD = 0.6
+
+    def __init__(self):
+        self._providers = {}
+        self.last_search_ms = 0.0
+
+    def set_models(self, model_groups):
+        """Index {provider: [model_id]}; providers whose list is unchanged are not re-indexed."""
+        providers = {}
+        for provider, model_ids in model_groups.items():
+            current = self._providers.get(provider)
+            if model_ids:
+                unchanged = current is not None and current.ids == list(model_ids)
+                providers[provider] = current if unchanged else _ProviderIndex(provider, model_ids)
+        self._providers = providers
+
+    def __len__(self):
+        return sum(len(index.ids) for index in self._providers.values())
+
+    def search(self, query, pinned=()):
+        """Group the labels matching query, best first.
+
+        Returns [(group, [label])]: a "Pinned" group holding the matching labels from pinned, in
+        that order, then one group per provider ordered by its best match. An empty query
+        matches everything, with providers in index order.
+        """
+        start = time.perf_counter()
+        terms = query.lower().replace(":", " ").split()
+        pinned_set = set(pinned)
+        matched_pins = set()
+        groups = []
+        for order, (provider, index) in enumerate(self._providers.items()):
+            scores = index.search(terms)
+            if scores is None:
+                # Everything matches: keep the listing order, and the provider order when nothing is ranked
+                ranked = index.labels
+                best = 1.0 if terms else -order
+            else:
+                # Stable over the ids in listing order, so equal scores keep that order
+                ranked = [index.labels[i] for i in sorted(sorted(scores), key=scores.__getitem__, reverse=True)]
+                best = max(scores.values(), default=None)
+            for label in pinned_set:
+                i = index.positions.get(label)
+                if i is not None and (scores is None or i in scores):
+                    matched_pins.add(label)
+            labels = [label for label in ranked if label not in pinned_set] if pinned_set else list(ranked)
+            if labels:
+                groups.append((best, provider, labels))
+        groups.sort(key=lambda group: -group[0])
+        result = [(provider, labels) for _, provider, labels in groups]
+        pinned_matches = [label for label in pinned if label in matched_pins]
+        if pinned_matches:
+            result.insert(0, ("Pinned", pinned_matches))
+        self.last_search_ms = (time.perf_counter() - start) * 1000
+        return result
+
+class ModelPalette(tk.Toplevel):
+    """Type-ahead model picker over a ModelIndex.
+
+    Results are grouped under provider headers with pinned (favorite and recent) models first.
+    Only the first PAGE_SIZE rows are inserted into the list; more are added as it is scrolled,
+    so a query matching thousands of models costs no more to show than one matching a page.
+    on_select(label) is called with the chosen model; on_toggle_favorite(label) stars or unstars it.
+    notes maps a provider to a remark shown in its header, such as a failed refresh.
+    """
+    PAGE_SIZE = 200
+
+    def __init__(self, master, index, on_select, on_toggle_favorite, favorites=(), recent=(), notes=None, colors=None):
+        super().__init__(master)
+        self.index = index
+        self.on_select = on_select
+        self.on_toggle_favorite = on_toggle_favorite
+        self.favorites = list(favorites)
+        self.recent = list(recent)
+        self.notes = notes or {}
+        colors = colors or {}
+        self.title("Select Model")
+        self.geometry("560x520")
+        self.transient(master)
+        self.configure(bg=colors.get("bg", "white"))
+
+        self.query_var = tk.StringVar(self)
+        self.entry = tk.Entry(self, textvariable=self.query_var, font=colors.get("font"),
+                              bg=colors.get("field_bg", "white"), fg=colors.get("fg", "black"),
+                              insertbackground=colors.get("fg", "black"), relief=tk.FLAT)
+        self.entry.pack(fill=tk.X, padx=10, pady=(10, 5), ipady=4)
+        frame = tk.Frame(self, bg=colors.get("bg", "white"))
+        frame.pack(fill=tk.BOTH, expand=True, padx=10)
+        self.scrollbar = tk.Scrollbar(frame, orient=tk.VERTICAL)
+        self.listbox = tk.Listbox(frame, activestyle="none", exportselection=False, font=colors.get("font"),
+                                  bg=colors.get("bg", "white"), fg=colors.get("fg", "black"),
+                                  selectbackground=colors.get("select_bg", "#cccccc"), relief=tk.FLAT,
+                                  highlightthickness=0, yscrollcommand=self._on_list_scroll)
+        self.scrollbar.configure(command=self.listbox.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.status = tk.Label(self, anchor="w", bg=colors.get("bg", "white"), fg=colors.get("muted", "gray"))
+        self.status.pack(fill=tk.X, padx=10, pady=(5, 10))
+        self.header_fg = colors.get("muted", "gray")
+
+        self._rows = []  # (label or None for a header, text) for every result row
+        self._shown = 0
+        self.query_var.trace_add("write", lambda *args: self.refresh())
+        self.entry.bind("<Down>", lambda event: self._move(1))
+        self.entry.bind("<Up>", lambda event: self._move(-1))
+        self.entry.bind("<Return>", lambda event: self._choose())
+        self.bind("<Escape>", lambda event: self.destroy())
+        # On the widgets rather than the window, so "break" stops Entry's own Ctrl+D from deleting a character
+        self.entry.bind("<Control-d>", lambda event: self._toggle_favorite())
+        self.listbox.bind("<Control-d>", lambda event: self._toggle_favorite())
+        self.listbox.bind("<Double-Button-1>", lambda event: self._choose())
+        self.listbox.bind("<Return>", lambda event: self._choose())
+        self.refresh()
+        self.entry.focus_set()
+
+    def pinned(self):
+        return list(dict.fromkeys(self.favorites + self.recent))
+
+    def refresh(self):
+        groups = self.index.search(self.query_var.get(), self.pinned())
+        rows = []
+        count = 0
+        for group, labels in groups:
+            note = f" · {self.notes[group]}" if group in self.notes else ""
+            rows.append((None, f"{group} ({len(labels):,}){note}"))
+            for label in labels:
+                star = "★ " if label in self.favorites else "   "
+                text = label if group == "Pinned" else label.split(": ", 1)[1]
+                rows.append((label, f"{star}{text}"))
+            count += len(labels)
+        self._rows = rows
+        self._shown = 0
+        self.listbox.delete(0, tk.END)
+        self._show_more()
+        self._move(1)
+        self.status.configure(
+            text=f"{count:,} of {len(self.index):,} models · {self.index.last_search_ms:.1f} ms · "
+                 "Enter to select, Ctrl+D to favorite"
+        )
+
+    def _show_more(self):
+        page = self._rows[self._shown:self._shown + self.PAGE_SIZE]
+        for label, text in page:
+            self.listbox.insert(tk.END, text)
+            if label is None:
+                self.listbox.itemconfigure(tk.END, foreground=self.header_fg, selectforeground=self.header_fg)
+        self._shown += len(page)
+
+    def _on_list_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) > 0.9 and self._shown < len(self._rows):
+            self._show_more()
+
+    def _selected_label(self):
+        selection = self.listbox.curselection()
+        return self._rows[selection[0]][0] if selection else None
+
+    def _move(self, step):
+        selection = self.listbox.curselection()
+        position = selection[0] + step if selection else 0
+        # Headers are not selectable
+        while 0 <= position < self._shown and self._rows[position][0] is None:
+            position += step if step else 1
+        if not 0 <= position < self._shown:
+            return "break"
+        if position >= self._shown - 1 and self._shown < len(self._rows):
+            self._show_more()
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(position)
+        self.listbox.see(position)
+        return "break"
+
+    def _choose(self):
+        label = self._selected_label()
+        if label:
+            self.destroy()
+            self.on_select(label)
+        return "break"
+
+    def _toggle_favorite(self):
+        label = self._selected_label()
+        if label:
+            if label in self.favorites:
+                self.favorites.remove(label)
+            else:
+                self.favorites.append(label)
+            self.on_toggle_favorite(label)
+            self.refresh()
+        return "break"
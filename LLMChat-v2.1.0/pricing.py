@@ -0,0 +1,113 @@
+from catalog import VERSION_SUFFIX, CatalogOverlay, bare_id, longest_prefix
+
+# USD per million tokens as (input, output, cached input) by model id; an entry also prices its dated
+# snapshots and release tags ("gpt-4o-2024-08-06", "mistral-large-latest") but not other variants
+# ("o1-pro", "gpt-4o-audio-preview"). Cached input is None where the provider bills cache reads at the input rate.
+# Catalog prices fetched from providers (OpenRouter, Together) take precedence over these.
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00, 1.25),
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+    "chatgpt-4o": (5.00, 15.00, None),
+    "gpt-4.1": (2.00, 8.00, 0.50),
+    "gpt-4.1-mini": (0.40, 1.60, 0.10),
+    "gpt-4.1-nano": (0.10, 0.40, 0.025),
+    "gpt-4-turbo": (10.00, 30.00, None),
+    "gpt-4-1106": (10.00, 30.00, None),
+    "gpt-4-0125": (10.00, 30.00, None),
+    "gpt-4": (30.00, 60.00, None),
+    "gpt-4-32k": (60.00, 120.00, None),
+    "gpt-3.5-turbo": (0.50, 1.50, None),
+    "o1": (15.00, 60.00, 7.50),
+    "o1-mini": (1.10, 4.40, 0.55),
+    "o3": (2.00, 8.00, 0.50),
+    "o3-mini": (1.10, 4.40, 0.55),
+    "o4-mini": (1.10, 4.40, 0.275),
+    "claude-3-opus": (15.00, 75.00, 1.50),
+    "claude-3-sonnet": (3.00, 15.00, 0.30),
+    "claude-3-5-sonnet": (3.00, 15.00, 0.30),
+    "claude-3-7-sonnet": (3.00, 15.00, 0.30),
+    "claude-3-haiku": (0.25, 1.25, 0.03),
+    "claude-3-5-haiku": (0.80, 4.00, 0.08),
+    "gemini-1.5-pro": (1.25, 5.00, 0.3125),
+    "gemini-1.5-flash": (0.075, 0.30, 0.01875),
+    "gemini-2.0-flash": (0.10, 0.40, 0.025),
+    "gemini-2.5-pro": (1.25, 10.00, 0.31),
+    "gemini-2.5-flash": (0.30, 2.50, 0.075),
+    "grok-beta": (5.00, 15.00, None),
+    "grok-2": (2.00, 10.00, None),
+    "grok-3": (3.00, 15.00, 0.75),
+    "grok-3-mini": (0.30, 0.50, 0.075),
+    "llama-3-sonar-large": (1.00, 1.00, None),
+    "llama-3-sonar-small": (0.20, 0.20, None),
+    "mistral-large": (2.00, 6.00, None),
+    "mistral-small": (0.20, 0.60, None),
+    "open-mixtral-8x7b": (0.70, 0.70, None),
+    "deepseek-chat": (0.27, 1.10, 0.07),
+    "deepseek-reasoner": (0.55, 2.19, 0.14),
+}
+
+# Prices from provider catalogs
+_catalog_prices = CatalogOverlay()
+
+def _rate(value, scale=1):
+    try:
+        return round(float(value) * scale, 6)
+    except (TypeError, ValueError):
+        return None
+
+def catalog_prices(provider, models):
+    """Prices per million tokens from a provider's raw model listing, as {model_id: (input, output, cached input)}.
+
+    OpenRouter gives USD per token as strings under "pricing" (prompt, completion, input_cache_read);
+    Together gives USD per million tokens (input, output). Other catalogs carry no prices.
+    """
+    prices = {}
+    for model in models:
+        pricing = model.get("pricing") if isinstance(model, dict) else None
+        model_id = model.get("id") if isinstance(model, dict) else None
+        if not pricing or not model_id:
+            continue
+        if provider == "OpenRouter":
+            rates = (_rate(pricing.get("prompt"), 1_000_000), _rate(pricing.get("completion"), 1_000_000),
+                     _rate(pricing.get("input_cache_read"), 1_000_000))
+        elif provider == "Together":
+            rates = (_rate(pricing.get("input")), _rate(pricing.get("output")), None)
+        else:
+            continue
+        # OpenRouter lists routers and variable-priced models at -1
+        if rates[0] is None or rates[1] is None or rates[0] < 0 or rates[1] < 0:
+            continue
+        prices[model_id] = rates
+    return prices
+
+def set_catalog_prices(provider, prices):
+    """Replace the catalog prices for a provider, e.g. from a fresh listing or the saved copy."""
+    _catalog_prices.set(provider, prices)
+
+def price_for(provider, model_id):
+    """(input, output, cached input) USD per million tokens for a model, or None if it is unknown."""
+    rates = _catalog_prices.get(provider, model_id)
+    if rates:
+        return rates
+    best = longest_prefix(MODEL_PRICES, bare_id(model_id), VERSION_SUFFIX)
+    if best:
+        return MODEL_PRICES[best]
+    return _catalog_prices.get_any(model_id)
+
+def compute_cost(provider, model_id, input_tokens, output_tokens, cached_tokens=0):
+    """Cost in USD of one request; cached_tokens is the part of input_tokens read from the prompt cache.
+
+    Returns None when the model's price is unknown rather than guessing.
+    """
+    rates = price_for(provider, model_id)
+    if rates is None:
+        return None
+    input_rate, output_rate, cached_rate = rates
+    cached_tokens = min(cached_tokens or 0, input_tokens or 0)
+    if cached_rate is None:
+        cached_rate = input_rate
+    return (
+        ((input_tokens or 0) - cached_tokens) * input_rate
+        + cached_tokens * cached_rate
+        + (output_tokens or 0) * output_rate
+    ) / 1_000_000
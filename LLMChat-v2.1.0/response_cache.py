@@ -0,0 +1,64 @@
+import hashlib
+import json
+import threading
+import time
+import db
+
+# Seconds a cached reply is served before the same request goes back to the provider
+RESPONSE_CACHE_TTL = 7 * 24 * 3600
+# Reply text kept in total, in bytes; the least recently used replies are evicted beyond it
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Sampling parameters are rounded to this many digits, so slider noise such as 0.7000000001 keeps the key
+PARAM_DIGITS = 4
+
+# Lookups since startup
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+def _canonical(value):
+    if isinstance(value, float):
+        return round(value, PARAM_DIGITS)
+    if isinstance(value, dict):
+        return {key: _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return value
+
+def cache_key(provider, model_id, messages, params):
+    """Hex SHA-256 identifying a request: provider, model, each message's role and content, and
+    the sampling parameters, serialized as JSON with sorted keys so equal requests always match."""
+    request = {
+        "provider": provider,
+        "model": model_id,
+        "messages": [{"role": msg["role"], "content": msg["content"]} for msg in messages],
+        "params": _canonical(params),
+    }
+    text = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+async def lookup(key, ttl=RESPONSE_CACHE_TTL):
+    """The cached reply for key as a row (response, input_tokens, output_tokens, cost, created_at), or None."""
+    row = await db.fetch_cached_response_from_db(key, time.time() - ttl)
+    with _stats_lock:
+        _stats["hits" if row is not None else "misses"] += 1
+    return row
+
+async def store(key, provider, model_id, response, input_tokens, output_tokens, cost,
+                ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+    """Cache a finished reply, evicting expired and least recently used replies to stay within max_bytes."""
+    await db.save_cached_response_in_db(
+        key, provider, model_id, response, input_tokens, output_tokens, cost, time.time() - ttl, max_bytes
+    )
+
+async def cache_stats():
+    """Hits and misses since startup with the hit rate, and the number and total size of cached replies."""
+    row = await db.fetch_response_cache_stats_from_db()
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "entries": row["entries"],
+        "size": row["size"],
+    }
@@ -0,0 +1,117 @@
+import json
+
+# Use orjson when available; it decodes straight from bytes and is several times faster
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+DONE_SENTINEL = b"[DONE]"
+
+def loads(data):
+    """Decode a JSON payload given as bytes."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+class SSEEvent:
+    __slots__ = ("event", "data", "id")
+
+    def __init__(self, event, data, id=None):
+        self.event = event
+        self.data = data
+        self.id = id
+
+    @property
+    def is_done(self):
+        return self.data == DONE_SENTINEL
+
+    def json(self):
+        return loads(self.data)
+
+    def __repr__(self):
+        return f"SSEEvent(event={self.event!r}, data={self.data!r}, id={self.id!r})"
+
+class SSEDecoder:
+    """Incremental server-sent-events decoder.
+
+    Bytes are fed in as they arrive from the network; complete events are returned as soon as
+    their terminating blank line is seen. Each read is split into lines in a single C-level pass
+    and only a trailing partial line is carried over to the next read.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._event = None
+        self._data = []
+        self.last_event_id = None
+
+    def feed(self, chunk):
+        """Feed raw bytes and return the list of events they complete."""
+        buffer = self._buffer + chunk if self._buffer else bytes(chunk)
+        # A trailing CR may be the first half of a CRLF split across reads, so leave it pending
+        limit = len(buffer) - 1 if buffer.endswith(b"\r") else len(buffer)
+        end = max(buffer.rfind(b"\n", 0, limit), buffer.rfind(b"\r", 0, limit))
+        if end == -1:
+            self._buffer = buffer
+            return []
+        self._buffer = buffer[end + 1:]
+        events = []
+        for line in buffer[:end + 1].splitlines():
+            if line:
+                self._process_line(line)
+            else:
+                event = self._dispatch()
+                if event is not None:
+                    events.append(event)
+        return events
+
+    def flush(self):
+        """Finish the stream, returning any event left without a trailing blank line."""
+        for line in self._buffer.splitlines():
+            if line:
+                self._process_line(line)
+        self._buffer = b""
+        event = self._dispatch()
+        return [event] if event is not None else []
+
+    def _process_line(self, line):
+        if line.startswith(b"data:"):
+            value = line[5:]
+            self._data.append(value[1:] if value[:1] == b" " else value)
+            return
+        if line[:1] == b":":  # comment / keep-alive
+            return
+        field, _, value = line.partition(b":")
+        if value[:1] == b" ":
+            value = value[1:]
+        if field == b"event":
+            self._event = value.decode("utf-8")
+        elif field == b"id":
+            self.last_event_id = value.decode("utf-8")
+        elif field == b"data":
+            self._data.append(value)
+
+    def _dispatch(self):
+        if not self._data:
+            self._event = None
+            return None
+        data = self._data[0] if len(self._data) == 1 else b"\n".join(self._data)
+        event = SSEEvent(self._event or "message", data, self.last_event_id)
+        self._event = None
+        self._data = []
+        return event
+
+async def iter_sse(response):
+    """Yield SSE events from an aiohttp response, stopping at the [DONE] sentinel."""
+    decoder = SSEDecoder()
+    async for chunk in response.content.iter_any():
+        for event in decoder.feed(chunk):
+            if event.is_done:
+                return
+            yield event
+    for event in decoder.flush():
+        if event.is_done:
+            return
+        yield event
@@ -0,0 +1,104 @@
+import hashlib
+import math
+import re
+import threading
+from collections import OrderedDict
+from catalog import bare_id, longest_prefix
+
+# Heuristic tokens relative to the base estimate, by model family prefix (then provider); the base
+# estimate is calibrated against a byte-level BPE with a ~65k vocabulary on English prose and code
+HEURISTIC_SCALES = {
+    "gpt": 0.9,
+    "o1": 0.9,
+    "o3": 0.9,
+    "o4": 0.9,
+    "claude": 1.0,
+    "gemini": 0.9,
+    "gemma": 0.9,
+    "llama": 0.9,
+    "grok": 0.9,
+    "mistral": 1.05,
+    "mixtral": 1.05,
+    "deepseek": 0.95,
+    "anthropic": 1.0,
+    "google": 0.9,
+}
+DEFAULT_HEURISTIC_SCALE = 1.0
+
+# Pre-tokenization close to the cl100k/o200k BPE split patterns, with stdlib re classes in place of \p{L}/\p{N}
+_PIECE_RE = re.compile(
+    r"'(?:[sdmt]|ll|ve|re)|[^\r\n\w]?[^\W\d_]+|\d{1,3}| ?[^\s\w]+[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"
+)
+# Letters a common word can run to before BPE starts splitting it, and letters per extra token
+WORD_CHARS = 7
+WORD_CHARS_PER_TOKEN = 4
+# Characters per token in runs of punctuation and in indentation
+SYMBOL_CHARS_PER_TOKEN = 3
+SPACE_CHARS_PER_TOKEN = 4
+# UTF-8 bytes per token in text outside ASCII, such as CJK, which BPE vocabularies cover sparsely
+NON_ASCII_BYTES_PER_TOKEN = 4
+
+TOKEN_CACHE_SIZE = 8192
+# Texts shorter than this are cheaper to count than to hash and look up
+MIN_CACHED_LENGTH = 64
+
+_count_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {"hits": 0, "misses": 0}
+
+def _split_model(model):
+    # Accepts the "Provider: model_id" labels used throughout the app, or a bare model id
+    provider, _, model_id = model.rpartition(": ")
+    return provider.lower(), bare_id(model_id)
+
+def tokenizer_for(model=""):
+    """Name of the tokenizer used to count text for a model, "heuristic:<scale>" for its family's scale."""
+    provider, model_id = _split_model(model or "")
+    family = longest_prefix(HEURISTIC_SCALES, model_id) or longest_prefix(HEURISTIC_SCALES, provider)
+    return f"heuristic:{HEURISTIC_SCALES[family] if family else DEFAULT_HEURISTIC_SCALE}"
+
+def heuristic_tokens(text, scale=DEFAULT_HEURISTIC_SCALE):
+    """Estimate the BPE token count of text from its pre-tokenized pieces, without a vocabulary."""
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        if not piece.isascii():
+            tokens += max(1, math.ceil(len(piece.encode("utf-8")) / NON_ASCII_BYTES_PER_TOKEN))
+        elif piece[-1].isalpha():
+            letters = len(piece) - (not piece[0].isalpha())
+            tokens += 1 + max(0, math.ceil((letters - WORD_CHARS) / WORD_CHARS_PER_TOKEN))
+        elif piece[0].isdigit() or piece[0] == "'":
+            tokens += 1
+        elif piece.isspace():
+            tokens += math.ceil(len(piece) / SPACE_CHARS_PER_TOKEN)
+        else:
+            tokens += math.ceil(len(piece.strip()) / SYMBOL_CHARS_PER_TOKEN) or 1
+    return math.ceil(tokens * scale)
+
+def _count(text, tokenizer):
+    return heuristic_tokens(text, float(tokenizer.partition(":")[2]))
+
+def count_tokens(text, model=""):
+    """Token count of text for a model ("Provider: model_id" or a bare id), memoized by content hash."""
+    if not text:
+        return 0
+    tokenizer = tokenizer_for(model)
+    if len(text) < MIN_CACHED_LENGTH:
+        return _count(text, tokenizer)
+    key = (tokenizer, hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+    with _cache_lock:
+        tokens = _count_cache.get(key)
+        if tokens is not None:
+            _count_cache.move_to_end(key)
+            _cache_stats["hits"] += 1
+            return tokens
+        _cache_stats["misses"] += 1
+    tokens = _count(text, tokenizer)
+    with _cache_lock:
+        _count_cache[key] = tokens
+        if len(_count_cache) > TOKEN_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return tokens
+
+def token_cache_stats():
+    with _cache_lock:
+        return {"size": len(_count_cache), **_cache_stats}
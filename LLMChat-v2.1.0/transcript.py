@@ -0,0 +1,302 @@
+import bisect
+import time
+from itertools import accumulate, islice
+from tkinter import font as tkfont
+
+class TranscriptItem:
+    """One message in the transcript. Plain data; a row widget is only bound to it while it is visible."""
+    __slots__ = ("role", "text", "message_id", "height", "measured")
+
+    def __init__(self, role, text, message_id=None):
+        self.role = role
+        self.text = text
+        self.message_id = message_id
+        self.height = 0
+        self.measured = False
+
+    def __repr__(self):
+        return f"TranscriptItem(role={self.role!r}, message_id={self.message_id!r}, height={self.height})"
+
+class TranscriptView:
+    """Virtualized message list drawn on a Canvas.
+
+    Messages are kept as TranscriptItems with a cached pixel height (estimated from the text
+    until the row has been shown once, then measured) and a prefix sum of heights for placing
+    them. Only rows overlapping the viewport plus OVERSCAN_PX above and below exist as widgets;
+    rows scrolled out are hidden and reused for the next item scrolled in, so the widget count
+    stays constant however long the conversation is. When content above the viewport changes
+    size (history prepended, estimates replaced by measurements) the view is re-anchored on the
+    first visible message, and a view scrolled to the end stays there.
+
+    create_row(parent) builds an empty row widget; bind_row(row, item) fills it for an item.
+    on_scroll(first, last) is forwarded every canvas scroll, as a Scrollbar.set would be.
+    """
+    OVERSCAN_PX = 400
+    PAD_X = 15
+    PAD_Y = 10
+    MAX_LAYOUT_PASSES = 3
+
+    def __init__(self, canvas, create_row, bind_row, on_scroll=None, font=None, wraplength=900):
+        self.canvas = canvas
+        self.create_row = create_row
+        self.bind_row = bind_row
+        self.on_scroll = on_scroll
+        self.wraplength = wraplength
+        self.items = []
+        self._by_id = {}
+        self._offsets = [0]
+        self._dirty_from = 0
+        self._live = {}
+        self._pool = []
+        self._stale = set()
+        self._anchor = None
+        self._layout_job = None
+        self._width = max(canvas.winfo_width(), 1)
+        metrics_font = tkfont.Font(root=canvas, font=font or "TkDefaultFont")
+        self._line_height = metrics_font.metrics("linespace")
+        self._char_width = max(1, metrics_font.measure("abcdefghijklmnopqrstuvwxyz") / 26)
+        self.rows_created = 0
+        self.last_layout_ms = 0.0
+        canvas.configure(yscrollcommand=self._on_yscroll)
+        canvas.bind("<Configure>", self._on_configure, add="+")
+
+    # Model
+
+    def append(self, item):
+        self.extend([item])
+        return item
+
+    def extend(self, items):
+        if not items:
+            return
+        self._capture_anchor()
+        self._dirty_from = min(self._dirty_from, len(self.items))
+        for item in items:
+            self._add(item)
+        self.items.extend(items)
+        self.schedule_layout()
+
+    def prepend(self, items):
+        """Insert older history above the current messages without moving what is on screen."""
+        if not items:
+            return
+        self._capture_anchor()
+        for item in items:
+            self._add(item)
+        self.items[:0] = items
+        self._dirty_from = 0
+        self.schedule_layout()
+
+    def update_item(self, item):
+        """Re-render an item whose text changed, such as a reply that is still streaming."""
+        # Streaming updates touch the last item, so search from the end
+        for index in range(len(self.items) - 1, -1, -1):
+            if self.items[index] is item:
+                break
+        else:
+            return  # cleared away, e.g. the user switched conversations mid-stream
+        # Before the height changes, so a view at the end follows the growing reply and one scrolled up stays put
+        self._capture_anchor()
+        item.height = self._estimate_height(item)
+        item.measured = False
+        self._stale.add(item)
+        self._mark_dirty(index)
+        self.schedule_layout()
+
+    def clear(self):
+        for item in list(self._live):
+            self._release(item)
+        self.items = []
+        self._by_id = {}
+        self._offsets = [0]
+        self._dirty_from = 0
+        self._stale.clear()
+        self._anchor = None
+        self.canvas.configure(scrollregion=(0, 0, self._width, 0))
+        self.canvas.yview_moveto(0)
+
+    def find(self, message_id):
+        return self._by_id.get(message_id)
+
+    def row_for(self, item):
+        live = self._live.get(item)
+        return live[0] if live else None
+
+    def refresh(self):
+        """Rebind every visible row, e.g. after a theme change."""
+        self._stale.update(self._live)
+        self.schedule_layout()
+
+    def stats(self):
+        return {
+            "items": len(self.items),
+            "live_rows": len(self._live),
+            "pooled_rows": len(self._pool),
+            "rows_created": self.rows_created,
+            "last_layout_ms": round(self.last_layout_ms, 2),
+        }
+
+    # Scrolling
+
+    def scroll_to_end(self):
+        self._anchor = "end"
+        self.schedule_layout()
+
+    def scroll_to(self, item, margin=PAD_Y):
+        self._anchor = (item, -margin)
+        self.schedule_layout()
+
+    def schedule_layout(self):
+        if self._layout_job is None:
+            self._layout_job = self.canvas.after_idle(self.layout)
+
+    def layout(self):
+        """Bind, measure and place the rows for the current viewport."""
+        if self._layout_job is not None:
+            self.canvas.after_cancel(self._layout_job)
+            self._layout_job = None
+        start = time.perf_counter()
+        self._capture_anchor()
+        # Measuring can change heights and re-anchoring can move the viewport onto new items,
+        # so repeat until nothing moves; estimates are close enough that this settles quickly
+        for _ in range(self.MAX_LAYOUT_PASSES):
+            resized = self._render_visible()
+            moved = self._restore_anchor()
+            if not resized and not moved:
+                break
+        self._anchor = None
+        self.last_layout_ms = (time.perf_counter() - start) * 1000
+
+    # Internals
+
+    def _add(self, item):
+        item.height = self._estimate_height(item)
+        item.measured = False
+        if item.message_id is not None:
+            self._by_id[item.message_id] = item
+
+    def _estimate_height(self, item):
+        chars_per_line = max(1, int(self.wraplength / self._char_width))
+        lines = sum(max(1, -(-len(paragraph) // chars_per_line)) for paragraph in item.text.split("\n"))
+        return lines * self._line_height + 2 * self.PAD_Y
+
+    def _mark_dirty(self, index):
+        self._dirty_from = min(self._dirty_from, index)
+
+    def _update_offsets(self):
+        if self._dirty_from >= len(self.items) and len(self._offsets) == len(self.items) + 1:
+            return
+        start = min(self._dirty_from, len(self._offsets) - 1)
+        heights = (item.height for item in islice(self.items, start, None))
+        self._offsets[start + 1:] = islice(accumulate(heights, initial=self._offsets[start]), 1, None)
+        self._dirty_from = len(self.items)
+
+    def _viewport(self):
+        top = self.canvas.canvasy(0)
+        return top, top + max(self.canvas.winfo_height(), 1)
+
+    def _capture_anchor(self):
+        # Remember what the user is looking at before content changes under it
+        if self._anchor is not None or not self.items:
+            return
+        self._update_offsets()
+        top, bottom = self._viewport()
+        if bottom >= self._offsets[-1] - 2:
+            self._anchor = "end"
+            return
+        index = max(0, bisect.bisect_right(self._offsets, top) - 1)
+        index = min(index, len(self.items) - 1)
+        self._anchor = (self.items[index], top - self._offsets[index])
+
+    def _restore_anchor(self):
+        self._update_offsets()
+        total = self._offsets[-1]
+        self.canvas.configure(scrollregion=(0, 0, self._width, total))
+        if self._anchor is None or not total:
+            return False
+        top, bottom = self._viewport()
+        height = bottom - top
+        if self._anchor == "end":
+            target = max(0, total - height)
+        else:
+            item, delta = self._anchor
+            try:
+                index = self.items.index(item)
+            except ValueError:
+                return False
+            target = min(max(0, self._offsets[index] + delta), max(0, total - height))
+        if abs(target - top) < 1:
+            return False
+        self.canvas.yview_moveto(target / total)
+        return True
+
+    def _render_visible(self):
+        """Show rows for items in the viewport plus overscan. Returns True if any height changed."""
+        self._update_offsets()
+        top, bottom = self._viewport()
+        first = max(0, bisect.bisect_right(self._offsets, top - self.OVERSCAN_PX) - 1)
+        last = min(len(self.items), bisect.bisect_left(self._offsets, bottom + self.OVERSCAN_PX))
+        visible = self.items[first:last]
+        wanted = set(visible)
+        for item in [item for item in self._live if item not in wanted]:
+            self._release(item)
+        bound = []
+        for index, item in enumerate(visible, start=first):
+            if item not in self._live:
+                self._acquire(item)
+                bound.append((index, item))
+            elif item in self._stale:
+                self.bind_row(self._live[item][0], item)
+                bound.append((index, item))
+        self._stale.difference_update(item for _, item in bound)
+        resized = False
+        if bound:
+            # One geometry pass measures every newly bound row
+            self.canvas.update_idletasks()
+            for index, item in bound:
+                height = self._live[item][0].winfo_reqheight() + 2 * self.PAD_Y
+                item.measured = True
+                if height != item.height:
+                    item.height = height
+                    self._mark_dirty(index)
+                    resized = True
+        self._update_offsets()
+        for index in range(first, last):
+            row, window = self._live[self.items[index]]
+            self.canvas.coords(window, self.PAD_X, self._offsets[index] + self.PAD_Y)
+        return resized
+
+    def _acquire(self, item):
+        if self._pool:
+            row, window = self._pool.pop()
+            self.canvas.itemconfigure(window, state="normal")
+        else:
+            row = self.create_row(self.canvas)
+            window = self.canvas.create_window(self.PAD_X, 0, window=row, anchor="nw", width=self._row_width())
+            self.rows_created += 1
+        row.item = item
+        self.bind_row(row, item)
+        self._live[item] = (row, window)
+
+    def _release(self, item):
+        row, window = self._live.pop(item)
+        row.item = None
+        self.canvas.itemconfigure(window, state="hidden")
+        self._pool.append((row, window))
+
+    def _row_width(self):
+        return max(1, self._width - 2 * self.PAD_X)
+
+    def _on_configure(self, event):
+        if event.width != self._width:
+            self._width = event.width
+            # Row heights depend on the label wraplength, not the canvas width, so cached heights stay valid
+            for row, window in list(self._live.values()) + self._pool:
+                self.canvas.itemconfigure(window, width=self._row_width())
+        self._capture_anchor()
+        self.schedule_layout()
+
+    def _on_yscroll(self, first, last):
+        if self.on_scroll:
+            self.on_scroll(first, last)
+        self.schedule_layout()
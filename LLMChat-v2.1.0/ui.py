@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext, simpledialog, Menu as tkMenu, messagebox, Text, filedialog
 import asyncio
 import threading
+import time
 import platform
 import pyperclip
 import json
@@ -9,12 +10,16 @@ import faiss
 import numpy as np
 from PyPDF2 import PdfReader
 from config import load_config, save_config
-from db import init_database, create_conversation_in_db, add_message_to_db, fetch_conversations_from_db, fetch_messages_from_db, update_conversation_title_in_db, delete_conversation_in_db, save_draft, load_draft
-from api import fetch_all_models, process_ai_response
+from db import init_database, close_database, create_conversation_in_db, queue_message, flush_writes, fetch_conversation_page_from_db, fetch_conversations_through_cursor_from_db, CHAT_LIST_PAGE_SIZE, fetch_conversation_from_db, fetch_messages_from_db, fetch_message_window_from_db, fetch_message_context_from_db, update_message_tokens_in_db, write_queue_stats, TRANSCRIPT_PAGE_SIZE, search_messages_in_db, MATCH_START, MATCH_END, update_conversation_title_in_db, update_conversation_model_in_db, delete_conversation_in_db, save_draft, load_draft, clear_response_cache_in_db
+from api import iter_all_models, model_sources, SLOW_MODEL_FETCH, load_model_catalog, cached_model_ids, load_saved_metadata, process_ai_response, close_clients
+from transcript import TranscriptView, TranscriptItem
+from context import ConversationLog, pack_context
+from model_registry import model_info, fit_max_tokens, describe_model
+from tokenizer import count_tokens
+from palette import ModelIndex, ModelPalette
 from tts import MacOSTTS, generate_and_play_audio_elevenlabs, GoogleCloudTTS, PiperTTS, Pyttsx3TTS, OpenAITTS, SesameCSMTTS
 from stt import GoogleCloudSTT, OpenAIWhisperSTT, WhisperXSTT
 import os
-import aiosqlite
 from datetime import datetime
 
 # Add path to Sesame CSM for Segment import
@@ -44,8 +49,19 @@ LIGHT_ACCENT_ASSISTANT = "#000000"
 
 FONT_FAMILY = "SF Pro Display" if platform.system() == "Darwin" else "Segoe UI"
 
-# Define DB_PATH at the top level
-DB_PATH = "voyeur_chat.db"
+# Models most recently chosen in the palette, kept pinned at its top with the favorites
+RECENT_MODELS_LIMIT = 8
+
+def format_usage_badge(message_count, total_tokens, total_cost):
+    """Short "12 msgs · 3.4k tok · $0.02" summary of a conversation's stats; empty if it has none."""
+    parts = []
+    if message_count:
+        parts.append(f"{message_count} msg" if message_count == 1 else f"{message_count} msgs")
+    if total_tokens:
+        parts.append(f"{total_tokens / 1000:.1f}k tok" if total_tokens >= 1000 else f"{total_tokens} tok")
+    if total_cost:
+        parts.append(f"${total_cost:.2f}")
+    return " · ".join(parts)
 
 class PlaceholderEntry(ttk.Entry):
     def __init__(self, parent, placeholder, style="Dark.TEntry", **kwargs):
@@ -61,9 +77,146 @@ class PlaceholderEntry(ttk.Entry):
         if not self.get():
             self.insert(0, self.placeholder)
 
+class UICommandQueue:
+    """Cross-thread queue of Tk calls, drained in batches on the Tk thread.
+
+    Background threads (the asyncio loop, STT/TTS callbacks) must not touch widgets directly, so
+    they post callables here. Commands posted with the same key replace the one still pending,
+    keeping its place in line. When the queue is full, posting threads wait briefly for the Tk
+    thread to catch up.
+    """
+    MAX_DEPTH = 1000
+    BATCH_SIZE = 200
+    DRAIN_INTERVAL_MS = 16
+    POST_TIMEOUT = 1.0
+
+    def __init__(self, root):
+        self.root = root
+        self.tk_thread = threading.current_thread()
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.sequence = 0
+        self.posted = 0
+        self.coalesced = 0
+        self.overflows = 0
+        self.drained = 0
+        self.max_depth = 0
+        self.last_drain_latency_ms = 0.0
+        self.root.after(self.DRAIN_INTERVAL_MS, self._drain)
+
+    def post(self, func, *args, key=None, **kwargs):
+        """Run func(*args, **kwargs) on the Tk thread; immediately if already on it."""
+        if threading.current_thread() is self.tk_thread:
+            func(*args, **kwargs)
+            return
+        with self.cond:
+            if key is not None and key in self.pending:
+                posted_at = self.pending[key][0]
+                self.pending[key] = (posted_at, func, args, kwargs)
+                self.coalesced += 1
+                return
+            if len(self.pending) >= self.MAX_DEPTH and not self.cond.wait_for(
+                    lambda: len(self.pending) < self.MAX_DEPTH, timeout=self.POST_TIMEOUT):
+                self.overflows += 1
+            if key is None:
+                self.sequence += 1
+                key = ("seq", self.sequence)
+            self.pending[key] = (time.perf_counter(), func, args, kwargs)
+            self.posted += 1
+            self.max_depth = max(self.max_depth, len(self.pending))
+
+    def stats(self):
+        return {
+            "depth": len(self.pending),
+            "max_depth": self.max_depth,
+            "posted": self.posted,
+            "coalesced": self.coalesced,
+            "drained": self.drained,
+            "overflows": self.overflows,
+            "drain_latency_ms": round(self.last_drain_latency_ms, 2),
+        }
+
+    def _drain(self):
+        with self.cond:
+            batch = []
+            for key in list(self.pending)[:self.BATCH_SIZE]:
+                batch.append(self.pending.pop(key))
+            if batch:
+                self.cond.notify_all()
+        if batch:
+            self.last_drain_latency_ms = (time.perf_counter() - batch[0][0]) * 1000
+            for _, func, args, kwargs in batch:
+                try:
+                    func(*args, **kwargs)
+                except Exception:
+                    # Reported like a failing Tk callback, and the rest of the batch still runs
+                    self.root.report_callback_exception(*sys.exc_info())
+            self.drained += len(batch)
+        self.root.after(self.DRAIN_INTERVAL_MS, self._drain)
+
+class StreamRenderScheduler:
+    """Frame-paced renderer for streaming replies.
+
+    Deltas may be queued from any thread; they are coalesced per stream and flushed together on
+    the Tk thread at a fixed cadence, so every active stream shares one layout pass per frame.
+    The cadence backs off from 60 Hz towards 10 Hz when a frame takes long to lay out.
+    """
+    MIN_INTERVAL_MS = 16
+    MAX_INTERVAL_MS = 100
+    IDLE_INTERVAL_MS = 50
+
+    def __init__(self, root, on_frame):
+        self.root = root
+        self.on_frame = on_frame
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.interval_ms = self.MIN_INTERVAL_MS
+        self.chunks_received = 0
+        self.frames_rendered = 0
+        self.last_frame_ms = 0.0
+        self.root.after(self.IDLE_INTERVAL_MS, self._tick)
+
+    def queue(self, delta, stream):
+        with self.lock:
+            self.pending.setdefault(stream, []).append(delta)
+            self.chunks_received += 1
+
+    def stats(self):
+        return {
+            "chunks_received": self.chunks_received,
+            "frames_rendered": self.frames_rendered,
+            "interval_ms": self.interval_ms,
+            "last_frame_ms": round(self.last_frame_ms, 2),
+        }
+
+    def _tick(self):
+        interval = self.IDLE_INTERVAL_MS
+        try:
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            if not pending:
+                return
+            start = time.perf_counter()
+            for stream, deltas in pending.items():
+                # The transcript item is created lazily here, on the Tk thread, on the stream's first frame
+                if stream.item is None:
+                    stream.item = self.root.add_transcript_message("assistant", "")
+                stream.item.text += "".join(deltas)
+                self.root.transcript.update_item(stream.item)
+            self.on_frame()
+            self.last_frame_ms = (time.perf_counter() - start) * 1000
+            self.frames_rendered += 1
+            # Leave the event loop at least 3x the frame cost for input and other work
+            self.interval_ms = int(min(self.MAX_INTERVAL_MS, max(self.MIN_INTERVAL_MS, self.last_frame_ms * 4)))
+            interval = self.interval_ms
+        finally:
+            # Re-armed even when a frame fails, which Tk reports; otherwise no stream would render again
+            self.root.after(interval, self._tick)
+
 class VoyeurChat(tk.Tk):
     def __init__(self):
         super().__init__()
+        self.ui_queue = UICommandQueue(self)
         self.config = load_config()
         self.style = ttk.Style(self)
         self.style.theme_use('clam')
@@ -99,7 +252,11 @@ class VoyeurChat(tk.Tk):
         self.title("Voyeur Chat")
         self.geometry("1600x1200")
 
-        self.conversation_id_map = {}
+        # Sidebar rows as (id, title, last_message_at, label), in listbox order; pages load on scroll
+        self.chat_list_rows = []
+        self._chat_list_cursor = None
+        self._chat_list_exhausted = False
+        self._chat_list_loading = False
         self.current_conversation_id = None
         self.available_models = []
         self.model_groups = {
@@ -107,17 +264,34 @@ class VoyeurChat(tk.Tk):
             'Google': [], 'Perplexity': [], 'Together': [], 'Groq': [], 'Pi': [],
             'Mistral': [], 'DeepSeek': []
         }
+        # Providers whose last model fetch failed, with the reason; their saved models are shown meanwhile
+        self.model_fetch_errors = {}
+        self.model_index = ModelIndex()
+        self.model_palette = None
         self.chat_modes = ["Normal", "Assistant", "Code Assistant", "Sarcastic Assistant", "Call Mode"]
         self.current_chat_mode = tk.StringVar(value=self.chat_modes[0])
-        self.conversation_log = []
+        self.conversation_log = ConversationLog()
         self.placeholder_visible = True
-        self.message_frames = []
+        self._transcript_cursor = None
+        self._transcript_exhausted = True
+        self._transcript_loading = False
+        self._transcript_ready = False
+        # Bumped to invalidate conversation loads and searches still in flight
+        self._load_generation = 0
+        self._search_generation = 0
+        # Messages recorded while a new conversation is being inserted, saved once it has an id
+        self._pending_messages = None
+        self._pending_lock = threading.Lock()
+        # Set while a picked conversation is loading; sending waits so its history goes with the message
+        self._conversation_loading = False
+        self.render_scheduler = StreamRenderScheduler(self, self._on_render_frame)
 
         self.loop = asyncio.new_event_loop()
         self.thread = threading.Thread(target=self.run_loop, daemon=True)
         self.thread.start()
 
         asyncio.run_coroutine_threadsafe(init_database(), self.loop).result()
+        asyncio.run_coroutine_threadsafe(load_saved_metadata(), self.loop)
         self._init_ui()
         
         # Initialize TTS providers
@@ -192,15 +366,10 @@ class VoyeurChat(tk.Tk):
         self.settings_panel.configure(style="Secondary.TFrame" if self.is_dark_mode.get() else "Secondary.Light.TFrame")
         self.chat_canvas.configure(bg=DARK_BG if self.is_dark_mode.get() else LIGHT_BG)
         self.chat_listbox.configure(bg=LEFT_PANEL_BG if self.is_dark_mode.get() else LIGHT_LEFT_PANEL_BG, fg=LIGHT_TEXT if self.is_dark_mode.get() else LIGHT_TEXT_DARK)
+        self.search_results.configure(bg=LEFT_PANEL_BG if self.is_dark_mode.get() else LIGHT_LEFT_PANEL_BG)
         self.user_input.configure(bg=MEDIUM_DARK_BG if self.is_dark_mode.get() else LIGHT_MEDIUM_BG, fg=LIGHT_TEXT if self.is_dark_mode.get() else LIGHT_TEXT_DARK, insertbackground=LIGHT_TEXT if self.is_dark_mode.get() else LIGHT_TEXT_DARK)
         self.status_window.configure(bg=DARK_BG if self.is_dark_mode.get() else LIGHT_BG, fg=LIGHT_TEXT if self.is_dark_mode.get() else LIGHT_TEXT_DARK)
-        for frame in self.message_frames:
-            frame.configure(style=theme)
-            for widget in frame.winfo_children():
-                if isinstance(widget, ttk.Label):
-                    widget.configure(style="MainDark.TLabel" if self.is_dark_mode.get() else "MainLight.TLabel")
-                elif isinstance(widget, ttk.Button):
-                    widget.configure(style="Dark.TButton" if self.is_dark_mode.get() else "Light.TButton")
+        self.transcript.refresh()
 
     def save_tts_config(self):
         self.config["tts_provider"] = self.tts_provider.get()
@@ -234,6 +403,8 @@ class VoyeurChat(tk.Tk):
         self.settings_menu.add_command(label="Set Default System Prompt", command=self.set_default_system_prompt)
         self.settings_menu.add_command(label="Upload File", command=self.upload_file)
         self.settings_menu.add_command(label="Export Conversation", command=self.export_conversation)
+        self.settings_menu.add_command(label="Clear Response Cache", command=self.clear_response_cache)
+        self.settings_menu.add_command(label="Show Performance Stats", command=self.show_performance_stats)
         self.config_menu.add_cascade(label="Settings", menu=self.settings_menu)
         self.config(menu=self.config_menu)
 
@@ -252,8 +423,17 @@ class VoyeurChat(tk.Tk):
                                        selectbackground=SELECT_BG_COLOR, selectforeground=LIGHT_TEXT,
                                        relief=tk.FLAT, bd=0, highlightthickness=0, exportselection=False, font=(FONT_FAMILY, 18))
         self.chat_listbox.pack(fill=tk.BOTH, expand=True, pady=5, padx=5)
+        self.chat_listbox.configure(yscrollcommand=self._on_chat_list_scroll)
         self.chat_listbox.bind("<<ListboxSelect>>", self.on_chat_select)
         self.chat_listbox.bind("<Button-3>", self.show_chat_list_context_menu)
+        # Full-text search results replace the chat list while a query is entered
+        self.search_results = tk.Text(self.chat_list_panel, wrap=tk.WORD, bg=LEFT_PANEL_BG, fg=MEDIUM_TEXT,
+                                      relief=tk.FLAT, bd=0, highlightthickness=0, cursor="hand2",
+                                      font=(FONT_FAMILY, 14), padx=8, pady=4)
+        self.search_results.tag_configure("title", foreground=LIGHT_TEXT, font=(FONT_FAMILY, 16, "bold"))
+        self.search_results.tag_configure("match", foreground=LIGHT_TEXT, background=SELECT_BG_COLOR)
+        self.search_results.tag_configure("badge", foreground=MEDIUM_TEXT, font=(FONT_FAMILY, 12))
+        self.search_results.configure(state=tk.DISABLED)
         ttk.Button(self.chat_list_panel, text="Delete Chat", command=self.delete_selected_thread, style="Dark.TButton").pack(fill=tk.X, pady=(0, 5), padx=10, side=tk.BOTTOM)
         ttk.Button(self.chat_list_panel, text="New Chat", command=self.create_new_conversation, style="Dark.TButton").pack(fill=tk.X, pady=(0, 10), padx=10, side=tk.BOTTOM)
 
@@ -266,16 +446,11 @@ class VoyeurChat(tk.Tk):
         self.chat_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, pady=(5, 0))
         self.chat_canvas = tk.Canvas(self.chat_frame, bg=DARK_BG, highlightthickness=0)
         self.chat_scrollbar = ttk.Scrollbar(self.chat_frame, orient=tk.VERTICAL, command=self.chat_canvas.yview)
-        self.chat_scrollable_frame = ttk.Frame(self.chat_canvas, style="MainDark.TFrame")
-        self.chat_scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.chat_canvas.configure(scrollregion=self.chat_canvas.bbox("all"))
-        )
-        self.chat_canvas.configure(yscrollcommand=self.chat_scrollbar.set)
         self.chat_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.chat_canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.chat_window = self.chat_canvas.create_window((0, 0), window=self.chat_scrollable_frame, anchor="nw")
-        self.chat_canvas.bind("<Configure>", lambda e: self.chat_canvas.itemconfig(self.chat_window, width=e.width))
+        # Only messages in view get widgets; rows are recycled as the transcript scrolls
+        self.transcript = TranscriptView(self.chat_canvas, self._create_message_row, self._bind_message_row,
+                                         on_scroll=self._on_transcript_scroll, font=(FONT_FAMILY, 18), wraplength=900)
         self.chat_canvas.bind_all("<MouseWheel>", self._on_mousewheel)
 
         # Input Area
@@ -329,11 +504,17 @@ class VoyeurChat(tk.Tk):
 
         controls_frame = settings_scrollable_frame
         ttk.Label(controls_frame, text="Model", style="Section.TLabel").pack(pady=(10, 5), anchor="w", padx=10)
-        self.model_var = tk.StringVar(self)
-        self.model_menu = ttk.OptionMenu(controls_frame, self.model_var, "Loading models...", style="Dark.TMenubutton")
-        self.model_menu.pack(fill=tk.X, pady=3, padx=10)
+        self.model_var = tk.StringVar(self, value="Loading models...")
+        # Opens the searchable model palette; a menu entry per model does not scale to thousands of models
+        self.model_button = ttk.Button(controls_frame, textvariable=self.model_var, command=self.open_model_palette, style="Dark.TButton")
+        self.model_button.pack(fill=tk.X, pady=3, padx=10)
         self.model_var.trace_add("write", self.on_model_change)
-        ttk.Button(controls_frame, text="Refresh Models", command=self.refresh_models, style="Dark.TButton").pack(fill=tk.X, pady=(0, 10), padx=10)
+        shortcut = "<Command-k>" if platform.system() == "Darwin" else "<Control-k>"
+        # Bound on the input too, where Text would otherwise delete to the end of the line
+        self.user_input.bind(shortcut, self.open_model_palette)
+        self.bind_all(shortcut, self.open_model_palette)
+        self.refresh_button = ttk.Button(controls_frame, text="Refresh Models", command=self.refresh_models, style="Dark.TButton")
+        self.refresh_button.pack(fill=tk.X, pady=(0, 10), padx=10)
         ttk.Button(controls_frame, text="Compare Models", command=self.compare_models, style="Dark.TButton").pack(fill=tk.X, pady=(0, 10), padx=10)
 
         ttk.Label(controls_frame, text="Chat Mode", style="Section.TLabel").pack(pady=(10, 5), anchor="w", padx=10)
@@ -469,6 +650,10 @@ class VoyeurChat(tk.Tk):
         self.reasoning_effort_menu = ttk.OptionMenu(self.advanced_frame, self.reasoning_effort_var, self.reasoning_effort_var.get(), *reasoning_options, style="Dark.TMenubutton")
         self.reasoning_effort_menu.pack(fill=tk.X, pady=3, padx=10)
 
+        # Off by default: a cached reply is replayed for an identical request instead of sampling a new one
+        self.response_cache_var = tk.BooleanVar(value=self.config.get("response_cache", False))
+        ttk.Checkbutton(self.advanced_frame, text="Cache Responses", variable=self.response_cache_var, command=self.toggle_response_cache, style="Dark.TCheckbutton").pack(fill=tk.X, pady=3, padx=10)
+
         ttk.Label(controls_frame, text="System Prompt", style="Secondary.Dark.TLabel").pack(pady=(5, 0), anchor="w", padx=10)
         self.system_prompt_text_widget = scrolledtext.ScrolledText(controls_frame, height=6, wrap=tk.WORD,
                                                                  bg=MEDIUM_DARK_BG, fg=LIGHT_TEXT, insertbackground=LIGHT_TEXT,
@@ -490,42 +675,103 @@ class VoyeurChat(tk.Tk):
         except (ValueError, TypeError):
             return default
 
-    def create_message_frame(self, role, text):
-        message_frame = ttk.Frame(self.chat_scrollable_frame, style="MainDark.TFrame" if self.is_dark_mode.get() else "MainLight.TFrame")
-        message_frame.pack(fill=tk.X, padx=15, pady=10, anchor="w")
-        self.message_frames.append(message_frame)
-        if len(self.message_frames) > 100:
-            oldest_frame = self.message_frames.pop(0)
-            oldest_frame.destroy()
-        label = ttk.Label(
-            message_frame,
-            text=f"{role.capitalize()}: {text}",
-            style="MainDark.TLabel" if self.is_dark_mode.get() else "MainLight.TLabel",
-            wraplength=900,
-            justify=tk.LEFT,
+    def add_transcript_message(self, role, text, message_id=None):
+        return self.transcript.append(TranscriptItem(role, text, message_id))
+
+    def _create_message_row(self, parent):
+        row = ttk.Frame(parent)
+        row.label = ttk.Label(row, wraplength=900, justify=tk.LEFT)
+        row.label.pack(side=tk.LEFT, anchor="w")
+        row.button_frame = ttk.Frame(row)
+        row.button_frame.pack(side=tk.RIGHT, anchor="e")
+        row.shown_buttons = ()
+        # Buttons act on whichever message the row is bound to when clicked
+        row.buttons = {
+            "play": ttk.Button(row.button_frame, text="▷", command=lambda: self.play_message(row.item.text), width=1),
+            "copy": ttk.Button(row.button_frame, text="📋", command=lambda: pyperclip.copy(row.item.text), width=1),
+            "refresh": ttk.Button(row.button_frame, text="↻", command=self.refresh_conversation, width=1),
+            "thumbs_up": ttk.Button(row.button_frame, text="👍", command=lambda: self.add_log_message("👍 Reaction added!", "system"), width=1),
+            "thumbs_down": ttk.Button(row.button_frame, text="👎", command=lambda: self.add_log_message("👎 Reaction added!", "system"), width=1),
+        }
+        return row
+
+    def _bind_message_row(self, row, item):
+        dark = self.is_dark_mode.get()
+        row.configure(style="MainDark.TFrame" if dark else "MainLight.TFrame")
+        row.button_frame.configure(style="MainDark.TFrame" if dark else "MainLight.TFrame")
+        row.label.configure(
+            text=f"{item.role.capitalize()}: {item.text}",
+            style="MainDark.TLabel" if dark else "MainLight.TLabel",
             foreground={
-                "user": ACCENT_COLOR_USER if self.is_dark_mode.get() else LIGHT_ACCENT_USER,
-                "assistant": ACCENT_COLOR_ASSISTANT if self.is_dark_mode.get() else LIGHT_ACCENT_ASSISTANT,
+                "user": ACCENT_COLOR_USER if dark else LIGHT_ACCENT_USER,
+                "assistant": ACCENT_COLOR_ASSISTANT if dark else LIGHT_ACCENT_ASSISTANT,
                 "system": SYSTEM_TEXT,
                 "error": ERROR_TEXT
-            }.get(role, LIGHT_TEXT if self.is_dark_mode.get() else LIGHT_TEXT_DARK),
-            font=(FONT_FAMILY, 18, "bold" if role == "user" else "normal")
+            }.get(item.role, LIGHT_TEXT if dark else LIGHT_TEXT_DARK),
+            font=(FONT_FAMILY, 18, "bold" if item.role == "user" else "normal")
         )
-        label.pack(side=tk.LEFT, anchor="w")
-        return message_frame, label
-
-    def debounce_stream_update(self, full_response, message_frame, label):
-        if not hasattr(self, '_update_timer'):
-            self._update_timer = None
-        if self._update_timer:
-            self.after_cancel(self._update_timer)
-        self._update_timer = self.after(100, lambda: self._commit_stream_update(full_response, message_frame, label))
-
-    def _commit_stream_update(self, full_response, message_frame, label):
-        label.config(text=f"Assistant: {full_response}")
-        self.chat_canvas.update_idletasks()
-        self.chat_canvas.configure(scrollregion=self.chat_canvas.bbox("all"))
-        self.chat_canvas.yview_moveto(1.0)
+        shown = ()
+        if item.role == "assistant":
+            shown = ("play",) if self._can_play() else ()
+            shown += ("copy", "refresh", "thumbs_up", "thumbs_down")
+        for button in row.buttons.values():
+            button.configure(style="Dark.TButton" if dark else "Light.TButton")
+        # Streaming rebinds the same row every frame, so only repack when the button set changes
+        if shown != row.shown_buttons:
+            for button in row.buttons.values():
+                button.pack_forget()
+            for name in shown:
+                row.buttons[name].pack(side=tk.LEFT, padx=3)
+            row.shown_buttons = shown
+
+    def _can_play(self):
+        provider = self.tts_provider.get()
+        if provider == "ElevenLabs":
+            return bool(self.config.get("voice_id"))
+        if provider == "macOS Native":
+            return bool(self.macos_tts and self.macos_tts.synthesizer)
+        return bool({
+            "Google Cloud": self.google_tts,
+            "OpenAI TTS": self.openai_tts,
+            "Piper": self.piper_tts,
+            "pyttsx3": self.pyttsx3_tts,
+            "Sesame CSM": self.sesame_csm,
+        }.get(provider))
+
+    def _on_transcript_scroll(self, first, last):
+        self.chat_scrollbar.set(first, last)
+        if float(first) <= 0.05 and self._transcript_ready and not self._transcript_exhausted and not self._transcript_loading:
+            self.load_older_messages()
+
+    def load_older_messages(self):
+        conv_id, before_id = self.current_conversation_id, self._transcript_cursor
+        if conv_id is None or before_id is None:
+            return
+        generation = self._load_generation
+        self._transcript_loading = True
+
+        def on_loaded(messages):
+            self._transcript_loading = False
+            if generation != self._load_generation or before_id != self._transcript_cursor:
+                return
+            self._transcript_exhausted = len(messages) < TRANSCRIPT_PAGE_SIZE
+            if not messages:
+                return
+            self._transcript_cursor = messages[0]["id"]
+            # The view keeps the messages on screen still while the page is inserted above them
+            self.transcript.prepend([TranscriptItem(msg["role"], msg["content"], msg["id"]) for msg in messages])
+
+        def on_failed(error):
+            self._transcript_loading = False
+        self.submit(fetch_message_window_from_db(conv_id, before_id), on_loaded, on_failed)
+
+    def schedule_stream_update(self, delta, stream):
+        self.render_scheduler.queue(delta, stream)
+
+    def _on_render_frame(self):
+        # Lay out synchronously so the scheduler's frame timing includes it; a view at the end
+        # stays there as the reply grows, one the user scrolled up is left alone
+        self.transcript.layout()
 
     def _on_mousewheel(self, event):
         self.chat_canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
@@ -543,6 +789,31 @@ class VoyeurChat(tk.Tk):
             self.add_log_message(f"Global Voice ID set to: {new_voice_id}", "system")
             self.refresh_conversation()
 
+    def toggle_response_cache(self):
+        self.config["response_cache"] = self.response_cache_var.get()
+        save_config(self.config)
+        if self.config["response_cache"]:
+            self.add_log_message("Response cache on: identical requests replay their saved reply.", "system")
+        else:
+            self.add_log_message("Response cache off.", "system")
+
+    def clear_response_cache(self):
+        self.submit(clear_response_cache_in_db(), lambda _: self.add_log_message("Response cache cleared.", "system"))
+
+    def show_performance_stats(self):
+        render = self.render_scheduler.stats()
+        queue = self.ui_queue.stats()
+        writes = write_queue_stats()
+        self.add_log_message(
+            f"Since startup: rendered {render['frames_rendered']} frames for {render['chunks_received']} chunks "
+            f"(last frame {render['last_frame_ms']} ms, interval {render['interval_ms']} ms); "
+            f"UI queue depth {queue['depth']} (max {queue['max_depth']}), {queue['posted']} posted, {queue['coalesced']} coalesced, "
+            f"last drain latency {queue['drain_latency_ms']} ms; write queue depth {writes['depth']}, {writes['rows']} rows "
+            f"in {writes['commits']} commits, last {writes['last_commit_ms']} ms, avg {writes['avg_commit_ms']} ms, max {writes['max_commit_ms']} ms, "
+            f"{writes['dropped']} dropped",
+            "system"
+        )
+
     def set_default_system_prompt(self):
         new_default_prompt = simpledialog.askstring("Default System Prompt", "Enter the default system prompt for new conversations:", initialvalue=self.config.get("default_system_prompt", "You are a helpful AI assistant."), parent=self)
         if new_default_prompt is not None:
@@ -556,17 +827,57 @@ class VoyeurChat(tk.Tk):
             return
         new_title = simpledialog.askstring("Rename Thread", "Enter new thread name:", parent=self)
         if new_title:
-            asyncio.run_coroutine_threadsafe(update_conversation_title_in_db(self.current_conversation_id, new_title), self.loop)
-            self.refresh_chat_list()
+            self.submit(update_conversation_title_in_db(self.current_conversation_id, new_title), lambda _: self.refresh_chat_list())
 
-    def load_or_create_conversation(self):
-        conversations = asyncio.run_coroutine_threadsafe(fetch_conversations_from_db(), self.loop).result()
-        if conversations:
-            self.current_conversation_id = conversations[0]["id"]
-            self.on_chat_select(None)
+    def submit(self, coro, callback=None, on_error=None):
+        """Run a coroutine on the background loop and hand its result to callback on the Tk thread.
+
+        If it raises, the error is logged and on_error, if given, is called with it on the Tk thread instead.
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+        def done(fut):
+            try:
+                result = fut.result()
+            except Exception as e:
+                self.add_log_message(f"Database error: {str(e)}", "error")
+                self.ui_queue.post(self._set_loading, False)
+                if on_error:
+                    self.ui_queue.post(on_error, e)
+                return
+            if callback:
+                self.ui_queue.post(callback, result)
+        future.add_done_callback(done)
+        return future
+
+    def _set_loading(self, loading):
+        if not hasattr(self, "loading_label"):
+            self.loading_label = ttk.Label(self.chat_frame, text="Loading...", style="MainDark.TLabel")
+        if loading:
+            self.loading_label.place(relx=0.5, rely=0.05, anchor="n")
+            self.configure(cursor="watch")
         else:
-            self.create_new_conversation()
-        self.refresh_chat_list()
+            self.loading_label.place_forget()
+            self.configure(cursor="")
+
+    def clear_transcript(self):
+        self.transcript.clear()
+        self.conversation_log = ConversationLog()
+        # Messages with ids below the cursor are not rendered; they page in when scrolling up
+        self._transcript_cursor = None
+        self._transcript_exhausted = True
+        self._transcript_loading = False
+        self._transcript_ready = False
+
+    def load_or_create_conversation(self):
+        def on_loaded(conversations):
+            if conversations:
+                self.load_conversation(conversations[0]["id"])
+                self._chat_list_exhausted = len(conversations) < CHAT_LIST_PAGE_SIZE
+                self.apply_chat_list(conversations)
+            else:
+                self.create_new_conversation()
+        self.submit(fetch_conversation_page_from_db(), on_loaded)
 
     def create_new_conversation(self):
         system_prompt = self.system_prompt_text_widget.get(1.0, tk.END).strip()
@@ -575,66 +886,260 @@ class VoyeurChat(tk.Tk):
         model_selection = self.model_var.get()
         current_model = "" if not model_selection or model_selection == "Loading models..." else model_selection
         new_title = f"New Chat {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        self.current_conversation_id = asyncio.run_coroutine_threadsafe(
-            create_conversation_in_db(title=new_title, model=current_model, system_prompt=system_prompt), self.loop
-        ).result()
-        for frame in self.message_frames:
-            frame.destroy()
-        self.message_frames = []
-        self.conversation_log = []
+        # Invalidate any conversation load still in flight
+        self._load_generation += 1
+        self._conversation_loading = False
+        pending = []
+        with self._pending_lock:
+            self.current_conversation_id = None
+            self._pending_messages = pending
+        self.clear_transcript()
+        self._transcript_ready = True
+
+        def on_created(conv_id):
+            with self._pending_lock:
+                # Still showing this conversation, not one picked while it was being created
+                if self._pending_messages is pending:
+                    self._pending_messages = None
+                    self.current_conversation_id = conv_id
+                messages = list(pending)
+            for message in messages:
+                queue_message(conv_id, *message)
+            # A message sent before the insert finished still names the chat
+            first_user = next((message[1] for message in messages if message[0] == "user"), None)
+            if first_user and self.current_conversation_id == conv_id:
+                self.update_conversation_title_from_message(first_user)
+            self.refresh_chat_list()
+        self.submit(create_conversation_in_db(title=new_title, model=current_model, system_prompt=system_prompt), on_created)
 
     def refresh_chat_list(self):
-        self.chat_listbox.delete(0, tk.END)
-        conversations = asyncio.run_coroutine_threadsafe(fetch_conversations_from_db(), self.loop).result()
-        self.conversation_id_map.clear()
-        for index, conv in enumerate(conversations):
-            conv_id, title = conv["id"], conv["title"]
-            display_title = title if title else f"Conversation {conv_id}"
-            self.chat_listbox.insert(tk.END, display_title)
-            self.conversation_id_map[index] = conv_id
-            if conv_id == self.current_conversation_id:
-                self.chat_listbox.selection_clear(0, tk.END)
+        # Re-read only the rows already on screen (plus any that became more recent) and diff them in
+        through = self._chat_list_cursor
+        if through is None:
+            def on_loaded(rows):
+                self._chat_list_exhausted = len(rows) < CHAT_LIST_PAGE_SIZE
+                self.apply_chat_list(rows)
+            self.submit(fetch_conversation_page_from_db(), on_loaded)
+        else:
+            self.submit(fetch_conversations_through_cursor_from_db(through), lambda rows: self.apply_chat_list(rows, through))
+
+    def load_more_chats(self):
+        after = self._chat_list_cursor
+        self._chat_list_loading = True
+
+        def on_loaded(rows):
+            self._chat_list_loading = False
+            # The list was reloaded from the top while this page was in flight
+            if after != self._chat_list_cursor:
+                return
+            self._chat_list_exhausted = len(rows) < CHAT_LIST_PAGE_SIZE
+            known = {row[0] for row in self.chat_list_rows}
+            for row in rows:
+                if row["id"] not in known:
+                    entry = self._chat_list_entry(row)
+                    self.chat_list_rows.append(entry)
+                    self.chat_listbox.insert(tk.END, entry[3])
+            self._update_chat_list_cursor()
+        self.submit(fetch_conversation_page_from_db(after), on_loaded)
+
+    def _on_chat_list_scroll(self, first, last):
+        # Also fires after inserts, so short pages keep loading until the list fills the panel
+        if float(last) >= 0.9 and not self._chat_list_exhausted and not self._chat_list_loading and self._chat_list_cursor:
+            self.load_more_chats()
+
+    def _chat_list_entry(self, row):
+        conv_id, title = row["id"], row["title"] or f"Conversation {row['id']}"
+        badge = format_usage_badge(row["message_count"], row["total_tokens"], row["total_cost"])
+        return conv_id, title, row["last_message_at"], f"{title}  ·  {badge}" if badge else title
+
+    def _update_chat_list_cursor(self):
+        last = self.chat_list_rows[-1] if self.chat_list_rows else None
+        self._chat_list_cursor = (last[2], last[0]) if last else None
+
+    def apply_chat_list(self, rows, through=None):
+        """Bring the sidebar in line with rows using in-place removals, moves, inserts and title updates.
+
+        `through` is the (last_message_at, id) cursor rows were read down to; rows already shown past
+        it (pages loaded while the refresh was in flight) are kept.
+        """
+        rows = [self._chat_list_entry(row) for row in rows]
+        if through is not None:
+            fetched = {row[0] for row in rows}
+            rows += [row for row in self.chat_list_rows if (row[2], row[0]) < tuple(through) and row[0] not in fetched]
+        listbox, current = self.chat_listbox, self.chat_list_rows
+        wanted = {row[0] for row in rows}
+        # Removals first, bottom up so indices stay valid
+        for index in range(len(current) - 1, -1, -1):
+            if current[index][0] not in wanted:
+                listbox.delete(index)
+                del current[index]
+        for index, row in enumerate(rows):
+            if index < len(current) and current[index][0] == row[0]:
+                if current[index][3] != row[3]:
+                    listbox.delete(index)
+                    listbox.insert(index, row[3])
+                current[index] = row
+                continue
+            # New, or moved up by recent activity: drop its old entry further down and insert here
+            old_index = next((i for i in range(index + 1, len(current)) if current[i][0] == row[0]), None)
+            if old_index is not None:
+                listbox.delete(old_index)
+                del current[old_index]
+            listbox.insert(index, row[3])
+            current.insert(index, row)
+        self._update_chat_list_cursor()
+        self._select_current_chat(see=through is None)
+
+    def bump_chat_to_top(self, conv_id):
+        """Move a conversation to the top of the sidebar after new activity, without a query."""
+        index = next((i for i, row in enumerate(self.chat_list_rows) if row[0] == conv_id), None)
+        if index is None or index == 0:
+            return
+        _, title, _, label = self.chat_list_rows.pop(index)
+        self.chat_listbox.delete(index)
+        self.chat_list_rows.insert(0, (conv_id, title, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"), label))
+        self.chat_listbox.insert(0, label)
+        self._select_current_chat(see=False)
+
+    def _select_current_chat(self, see=True):
+        self.chat_listbox.selection_clear(0, tk.END)
+        for index, row in enumerate(self.chat_list_rows):
+            if row[0] == self.current_conversation_id:
                 self.chat_listbox.selection_set(index)
                 self.chat_listbox.activate(index)
-                self.chat_listbox.see(index)
+                if see:
+                    self.chat_listbox.see(index)
+                break
+
+    def _chat_id_at(self, index):
+        return self.chat_list_rows[index][0] if 0 <= index < len(self.chat_list_rows) else None
 
     def search_chats(self, event=None):
-        query = self.search_entry.get().strip().lower()
-        if query == "search chats...":
+        query = self.search_entry.get().strip()
+        if query.lower() == "search chats...":
             query = ""
-        self.chat_listbox.delete(0, tk.END)
-        self.conversation_id_map.clear()
-        conversations = asyncio.run_coroutine_threadsafe(fetch_conversations_from_db(), self.loop).result()
-        for index, conv in enumerate(conversations):
-            conv_id, title = conv["id"], conv["title"]
-            if query in title.lower() or not query:
-                display_title = title if title else f"Conversation {conv_id}"
-                self.chat_listbox.insert(tk.END, display_title)
-                self.conversation_id_map[index] = conv_id
-                if conv_id == self.current_conversation_id:
-                    self.chat_listbox.selection_set(index)
-
-    async def _on_chat_select_async(self, conv_id):
-        async with aiosqlite.connect(DB_PATH) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("SELECT llm_model, system_prompt FROM conversations WHERE id = ?", (conv_id,))
-            conv_data = await cursor.fetchone()
-        return conv_data
+        # Drop results from earlier keystrokes that finish after this one
+        self._search_generation += 1
+        generation = self._search_generation
+        if not query:
+            self.search_results.pack_forget()
+            self.chat_listbox.pack(fill=tk.BOTH, expand=True, pady=5, padx=5)
+            self.refresh_chat_list()
+            return
+
+        def on_loaded(results):
+            if generation != self._search_generation:
+                return
+            self.show_search_results(results)
+        self.submit(search_messages_in_db(query), on_loaded)
+
+    def show_search_results(self, results):
+        self.chat_listbox.pack_forget()
+        self.search_results.pack(fill=tk.BOTH, expand=True, pady=5, padx=5)
+        widget = self.search_results
+        widget.configure(state=tk.NORMAL)
+        widget.delete("1.0", tk.END)
+        for tag in widget.tag_names():
+            if tag.startswith("result"):
+                widget.tag_delete(tag)
+        if not results:
+            widget.insert(tk.END, "No matches")
+        for index, result in enumerate(results):
+            tag = f"result{index}"
+            widget.insert(tk.END, result["title"], ("title", tag))
+            badge = format_usage_badge(result["message_count"], result["total_tokens"], result["total_cost"])
+            if result["last_model"]:
+                badge = " · ".join(filter(None, [badge, result["last_model"].rpartition(": ")[2]]))
+            widget.insert(tk.END, f"  {badge}\n" if badge else "\n", ("badge", tag))
+            # Snippets mark matches with MATCH_START/MATCH_END; render those spans highlighted
+            for part_index, part in enumerate(result["snippet"].split(MATCH_START)):
+                matched, _, rest = part.partition(MATCH_END) if part_index else ("", "", part)
+                if matched:
+                    widget.insert(tk.END, matched, ("match", tag))
+                widget.insert(tk.END, rest, (tag,))
+            widget.insert(tk.END, "\n\n", (tag,))
+            widget.tag_bind(tag, "<Button-1>", lambda e, r=result: self.open_search_result(r["conversation_id"], r["message_id"]))
+        widget.configure(state=tk.DISABLED)
+
+    def open_search_result(self, conv_id, message_id):
+        if conv_id == self.current_conversation_id and self.transcript.find(message_id) is not None:
+            self.scroll_to_message(message_id)
+        else:
+            self.load_conversation(conv_id, focus_message_id=message_id)
+
+    def scroll_to_message(self, message_id):
+        item = self.transcript.find(message_id)
+        if item is not None:
+            self.transcript.scroll_to(item)
+
+    async def _on_chat_select_async(self, conv_id, focus_message_id=None):
+        conv_data = await fetch_conversation_from_db(conv_id)
+        messages = await fetch_message_window_from_db(conv_id)
+        if focus_message_id is not None and messages and focus_message_id < messages[0]["id"]:
+            # Open far enough back to show the requested message
+            messages = await fetch_messages_from_db(conv_id, from_id=focus_message_id)
+        # The prompt needs the whole history regardless of how much of it is on screen
+        model = conv_data["llm_model"] if conv_data and conv_data["llm_model"] else ""
+        context = []
+        uncounted = []
+        for row in await fetch_message_context_from_db(conv_id):
+            tokens = row["tokens"]
+            if tokens is None:
+                # Saved before token counts were recorded; count it once and store the count
+                tokens = count_tokens(row["content"], model)
+                uncounted.append((tokens, row["id"]))
+            context.append(({"role": row["role"], "content": row["content"]}, tokens))
+        if uncounted:
+            await update_message_tokens_in_db(uncounted)
+        draft = await load_draft(conv_id)
+        return conv_data, messages, context, draft
 
     def on_chat_select(self, event):
         if not self.chat_listbox.curselection():
             return
         selected_index = self.chat_listbox.curselection()[0]
-        if selected_index not in self.conversation_id_map:
+        conv_id = self._chat_id_at(selected_index)
+        if conv_id is None:
             return
-        conv_id = self.conversation_id_map[selected_index]
         if conv_id == self.current_conversation_id and event is not None:
             return
-        self.current_conversation_id = conv_id
-
-        # Run async operation in the event loop
-        conv_data = asyncio.run_coroutine_threadsafe(self._on_chat_select_async(conv_id), self.loop).result()
+        self.load_conversation(conv_id)
+
+    def load_conversation(self, conv_id, focus_message_id=None):
+        with self._pending_lock:
+            self.current_conversation_id = conv_id
+            self._pending_messages = None
+        self._load_generation += 1
+        generation = self._load_generation
+        self._conversation_loading = True
+        self._set_loading(True)
+
+        def on_loaded(result):
+            # The user picked another conversation while this one was loading
+            if generation != self._load_generation:
+                return
+            self._set_loading(False)
+            self._show_conversation(*result)
+            self._conversation_loading = False
+            self.after_idle(lambda: self._finish_transcript_load(focus_message_id))
+
+        def on_failed(error):
+            if generation == self._load_generation:
+                # Nothing of the previous conversation may go out under this one's id
+                self.clear_transcript()
+                self._transcript_ready = True
+                self._conversation_loading = False
+                self.add_log_message(f"Could not load this chat: {error}", "error")
+        self.submit(self._on_chat_select_async(conv_id, focus_message_id), on_loaded, on_failed)
+
+    def _finish_transcript_load(self, focus_message_id=None):
+        if focus_message_id is not None and self.transcript.find(focus_message_id) is not None:
+            self.scroll_to_message(focus_message_id)
+        else:
+            self.transcript.scroll_to_end()
+        self._transcript_ready = True
 
+    def _show_conversation(self, conv_data, messages, context, draft):
         if conv_data:
             loaded_model, loaded_system_prompt = conv_data["llm_model"], conv_data["system_prompt"]
             if loaded_model and loaded_model != "Loading models..." and self.model_var.get() != loaded_model:
@@ -644,21 +1149,23 @@ class VoyeurChat(tk.Tk):
                 self.system_prompt_text_widget.delete(1.0, tk.END)
                 self.system_prompt_text_widget.insert(tk.END, loaded_system_prompt)
 
-        for frame in self.message_frames:
-            frame.destroy()
-        self.message_frames = []
+        self.clear_transcript()
         self.status_window.delete(1.0, tk.END)
+        self.conversation_log = ConversationLog()
+        for message, tokens in context:
+            self.conversation_log.append(message, tokens)
+        if messages:
+            self._transcript_cursor = messages[0]["id"]
+            self._transcript_exhausted = len(context) <= len(messages)
 
-        messages = asyncio.run_coroutine_threadsafe(fetch_messages_from_db(self.current_conversation_id), self.loop).result()
-        self.conversation_log = []
         for msg in messages:
-            role, content, timestamp, tokens, cost = msg["role"], msg["content"], msg["timestamp"], msg["tokens"], msg["cost"]
-            self.add_log_message(content, role, timestamp)
-            if tokens and cost:
-                self.add_log_message(f"Tokens: {tokens}, Estimated Cost: ${cost:.4f}", "system")
+            if msg["cost"] is not None and msg["output_tokens"] is not None:
+                self.add_log_message(
+                    f"Usage: {msg['input_tokens'] or 0:,} input, {msg['output_tokens']:,} output tokens, cost ${msg['cost']:.4f}", "system"
+                )
+        self.transcript.extend([TranscriptItem(msg["role"], msg["content"], msg["id"]) for msg in messages])
 
         # Load draft if available
-        draft = asyncio.run_coroutine_threadsafe(load_draft(self.current_conversation_id), self.loop).result()
         if draft:
             self.user_input.delete("1.0", tk.END)
             self.user_input.insert("1.0", draft)
@@ -667,17 +1174,15 @@ class VoyeurChat(tk.Tk):
     async def _update_conversation_title_from_message_async(self, message_content):
         if not self.current_conversation_id:
             return
-        async with aiosqlite.connect(DB_PATH) as db:
-            cursor = await db.execute("SELECT title FROM conversations WHERE id = ?", (self.current_conversation_id,))
-            current_title = (await cursor.fetchone())[0]
-        if current_title.startswith("New Chat"):
+        conversation = await fetch_conversation_from_db(self.current_conversation_id)
+        if conversation and conversation["title"].startswith("New Chat"):
             words = message_content.split()
             potential_title = " ".join(words[:5])
             if len(potential_title) > 50:
                 potential_title = potential_title[:47] + "..."
             if potential_title:
                 await update_conversation_title_in_db(self.current_conversation_id, potential_title)
-                self.refresh_chat_list()
+                self.ui_queue.post(self.refresh_chat_list, key="refresh_chat_list")
 
     def update_conversation_title_from_message(self, message_content):
         # Run async operation in the event loop
@@ -687,7 +1192,7 @@ class VoyeurChat(tk.Tk):
         if not self.chat_listbox.curselection():
             return
         selected_index = self.chat_listbox.curselection()[0]
-        conv_id = self.conversation_id_map.get(selected_index)
+        conv_id = self._chat_id_at(selected_index)
         if conv_id is None:
             return
         context_menu = tkMenu(self, tearoff=0)
@@ -696,25 +1201,21 @@ class VoyeurChat(tk.Tk):
         context_menu.tk_popup(event.x_root, event.y_root)
 
     def edit_conversation_title(self, conv_id, listbox_index):
-        current_title = self.chat_listbox.get(listbox_index)
+        current_title = self.chat_list_rows[listbox_index][1]
         new_title = simpledialog.askstring("Edit Title", "Enter new title:", initialvalue=current_title, parent=self)
         if new_title and new_title.strip():
-            asyncio.run_coroutine_threadsafe(update_conversation_title_in_db(conv_id, new_title.strip()), self.loop)
-            self.refresh_chat_list()
+            self.submit(update_conversation_title_in_db(conv_id, new_title.strip()), lambda _: self.refresh_chat_list())
 
     def delete_conversation(self, conv_id):
         if not messagebox.askyesno("Delete Chat", "Are you sure you want to delete this chat and all its messages? This cannot be undone.", parent=self):
             return
-        asyncio.run_coroutine_threadsafe(delete_conversation_in_db(conv_id), self.loop)
         if self.current_conversation_id == conv_id:
             self.current_conversation_id = None
-            for frame in self.message_frames:
-                frame.destroy()
-            self.message_frames = []
-            self.conversation_log = []
+            self.clear_transcript()
             self.status_window.delete(1.0, tk.END)
-            self.load_or_create_conversation()
-        self.refresh_chat_list()
+            self.submit(delete_conversation_in_db(conv_id), lambda _: self.load_or_create_conversation())
+        else:
+            self.submit(delete_conversation_in_db(conv_id), lambda _: self.refresh_chat_list())
 
     def reset_presence_penalty(self):
         self.presence_penalty_var.set(0.0)
@@ -729,6 +1230,10 @@ class VoyeurChat(tk.Tk):
         self.top_k_var.set(40)
 
     def add_log_message(self, message_text, level="system", timestamp_str=None):
+        # Safe to call from any thread; widget work always happens on the Tk thread
+        self.ui_queue.post(self._add_log_message, message_text, level, timestamp_str)
+
+    def _add_log_message(self, message_text, level="system", timestamp_str=None):
         if timestamp_str is None:
             timestamp = datetime.now().strftime("[%H:%M:%S]")
         else:
@@ -745,86 +1250,36 @@ class VoyeurChat(tk.Tk):
             self.status_window.config(state=tk.NORMAL)
             return
 
-        message_frame, label = self.create_message_frame(level, message_text)
-        button_frame = ttk.Frame(message_frame, style="MainDark.TFrame" if self.is_dark_mode.get() else "MainLight.TFrame")
-        button_frame.pack(side=tk.RIGHT, anchor="e")
-
-        if level == "assistant":
-            can_play = False
-            provider = self.tts_provider.get()
-            if provider == "ElevenLabs" and self.config.get("voice_id"):
-                can_play = True
-            elif provider == "macOS Native" and self.macos_tts and self.macos_tts.synthesizer:
-                can_play = True
-            elif provider == "Google Cloud" and self.google_tts:
-                can_play = True
-            elif provider == "OpenAI TTS" and self.openai_tts:
-                can_play = True
-            elif provider == "Piper" and self.piper_tts:
-                can_play = True
-            elif provider == "pyttsx3" and self.pyttsx3_tts:
-                can_play = True
-            elif provider == "Sesame CSM" and self.sesame_csm:
-                can_play = True
-
-            if can_play:
-                play_button = ttk.Button(
-                    button_frame,
-                    text="▷",
-                    command=lambda: self.play_message(message_text),
-                    style="Dark.TButton" if self.is_dark_mode.get() else "Light.TButton",
-                    width=1
-                )
-                play_button.pack(side=tk.LEFT, padx=3)
-
-            copy_button = ttk.Button(
-                button_frame,
-                text="📋",
-                command=lambda: pyperclip.copy(message_text),
-                style="Dark.TButton" if self.is_dark_mode.get() else "Light.TButton",
-                width=1
-            )
-            copy_button.pack(side=tk.LEFT, padx=3)
-
-            refresh_button = ttk.Button(
-                button_frame,
-                text="↻",
-                command=self.refresh_conversation,
-                style="Dark.TButton" if self.is_dark_mode.get() else "Light.TButton",
-                width=1
-            )
-            refresh_button.pack(side=tk.LEFT, padx=3)
-
-            thumbs_up = ttk.Button(
-                button_frame,
-                text="👍",
-                command=lambda: self.add_log_message("👍 Reaction added!", "system"),
-                style="Dark.TButton" if self.is_dark_mode.get() else "Light.TButton",
-                width=1
-            )
-            thumbs_up.pack(side=tk.LEFT, padx=3)
-
-            thumbs_down = ttk.Button(
-                button_frame,
-                text="👎",
-                command=lambda: self.add_log_message("👎 Reaction added!", "system"),
-                style="Dark.TButton" if self.is_dark_mode.get() else "Light.TButton",
-                width=1
-            )
-            thumbs_down.pack(side=tk.LEFT, padx=3)
+        self.add_transcript_message(level, message_text)
 
+        # Loaded history goes straight to the transcript, so everything logged here is new
         if level in ["user", "assistant"]:
-            self.conversation_log.append({"role": level, "content": message_text})
-        if self.current_conversation_id and level in ["user", "assistant"]:
-            asyncio.run_coroutine_threadsafe(
-                add_message_to_db(self.current_conversation_id, level, message_text), self.loop
-            )
-            if level == "user":
+            self.record_message(level, message_text)
+            if level == "user" and self.current_conversation_id:
+                self.bump_chat_to_top(self.current_conversation_id)
                 self.update_conversation_title_from_message(message_text)
 
+    def record_message(self, role, content, tokens=None, cost=None, input_tokens=None, output_tokens=None, model=None):
+        """Add a new message to the prompt history and queue it for saving with its token count, usage
+        and, for a reply, the "Provider: model_id" that wrote it.
+
+        Safe from any thread when tokens is given; otherwise it is counted for the selected model,
+        which reads a Tk variable.
+        """
+        if tokens is None:
+            tokens = count_tokens(content, self.model_var.get())
+        self.conversation_log.append({"role": role, "content": content}, tokens)
+        with self._pending_lock:
+            if self._pending_messages is not None:
+                self._pending_messages.append((role, content, tokens, cost, input_tokens, output_tokens, model))
+                return
+            conv_id = self.current_conversation_id
+        if conv_id:
+            queue_message(conv_id, role, content, tokens, cost, input_tokens, output_tokens, model)
+
     def refresh_conversation(self):
         if self.current_conversation_id:
-            self.on_chat_select(None)
+            self.load_conversation(self.current_conversation_id)
 
     def refresh_macos_voices(self):
         if not self.macos_tts:
@@ -839,6 +1294,10 @@ class VoyeurChat(tk.Tk):
             self.macos_voice.set(self.macos_voices[0] if self.macos_voices else "Alex")
         self.add_log_message("macOS voices refreshed.", "system")
 
+    def autoplay_message(self, message_text):
+        if self.tts_provider.get() != "None":
+            self.play_message(message_text)
+
     def play_message(self, message_text):
         provider = self.tts_provider.get()
         if provider == "None":
@@ -888,41 +1347,94 @@ class VoyeurChat(tk.Tk):
         self.refresh_button.config(state=tk.DISABLED, text="Refreshing...")
         self.after(100, lambda: asyncio.run_coroutine_threadsafe(self._fetch_all_models_thread(), self.loop))
 
-    async def _fetch_all_models_thread(self):
-        self.model_groups = await fetch_all_models(self.config)
-        for provider, models in self.model_groups.items():
-            if models:
-                self.add_log_message(f"Fetched {len(models)} {provider} models", "system")
-                await cache_models(provider, models)
+    async def _fetch_all_models_thread(self, max_age=None):
+        """Fill the model menu from the saved listings at once, then merge in each provider as it answers.
+
+        Listings younger than their TTL are not refetched; max_age=0 revalidates every one.
+        """
+        catalog = await load_model_catalog()
+        sources = model_sources(self.config)
+        groups = {provider: [] for provider in self.model_groups}
+        groups.update((provider, models) for provider, models in cached_model_ids(catalog).items() if provider in sources)
+        self._set_model_groups(groups)
+        if self.available_models:
+            self.add_log_message(f"Loaded {len(self.available_models)} saved models; checking providers for updates...", "system")
+        pending = len(sources)
+        async for provider, models, elapsed, error in iter_all_models(self.config, catalog, max_age):
+            pending -= 1
+            if error:
+                self.model_fetch_errors[provider] = error
+                kept = f"; keeping {len(models)} saved models" if models else ""
+                self.add_log_message(f"{provider} models unavailable ({error}){kept}", "error")
             else:
-                self.add_log_message(f"No/Error {provider} models", "error")
-        self.available_models = []
-        for provider, models in self.model_groups.items():
-            if models:
-                for model_id in models:
-                    self.available_models.append(f"{provider}: {model_id}")
+                self.model_fetch_errors.pop(provider, None)
+                slow = f" (slow: {elapsed:.1f} s)" if elapsed >= SLOW_MODEL_FETCH else ""
+                self.add_log_message(f"Fetched {len(models)} {provider} models{slow}", "system")
+            self._set_model_groups(dict(self.model_groups, **{provider: models}))
+            if pending:
+                self.ui_queue.post(self.refresh_button.config, key="refresh_button", text=f"Refreshing ({pending} left)...")
         if not self.available_models:
             self.add_log_message("No models available from any provider.", "error")
-        self.after(0, self.update_model_list)
-        self.refresh_button.config(state=tk.NORMAL, text="Refresh Models")
+        self.ui_queue.post(self.refresh_button.config, key="refresh_button", state=tk.NORMAL, text="Refresh Models")
+
+    def _set_model_groups(self, model_groups):
+        self.model_groups = model_groups
+        self.available_models = [
+            f"{provider}: {model_id}" for provider, models in model_groups.items() for model_id in models
+        ]
+        # Indexed here, off the Tk thread; only providers whose listing changed are rebuilt
+        self.model_index.set_models(model_groups)
+        self.ui_queue.post(self.update_model_list, key="update_model_list")
 
     def update_model_list(self):
-        menu = self.model_menu['menu']
-        menu.delete(0, 'end')
         current_selection = self.model_var.get()
-        new_selection = None
         if not self.available_models:
-            menu.add_command(label="No models available", command=tk._setit(self.model_var, "No models available"))
             new_selection = "No models available"
+        elif current_selection in self.available_models:
+            new_selection = current_selection
         else:
-            for model_id in self.available_models:
-                menu.add_command(label=model_id, command=tk._setit(self.model_var, model_id))
-            if current_selection in self.available_models:
-                new_selection = current_selection
-            else:
-                new_selection = self.available_models[0]
-        if new_selection and self.model_var.get() != new_selection:
+            recent = [model for model in self.config.get("recent_models", []) if model in self.available_models]
+            new_selection = recent[0] if recent else self.available_models[0]
+        if self.model_var.get() != new_selection:
             self.model_var.set(new_selection)
+        if self.model_palette is not None and self.model_palette.winfo_exists():
+            self.model_palette.notes = self._model_palette_notes()
+            self.model_palette.refresh()
+
+    def _model_palette_notes(self):
+        return {provider: f"saved list, refresh failed: {error}" for provider, error in self.model_fetch_errors.items()}
+
+    def open_model_palette(self, event=None):
+        if self.model_palette is not None and self.model_palette.winfo_exists():
+            self.model_palette.lift()
+            self.model_palette.entry.focus_set()
+            return "break"
+        dark = self.is_dark_mode.get()
+        colors = {
+            "bg": LEFT_PANEL_BG if dark else LIGHT_LEFT_PANEL_BG,
+            "field_bg": MEDIUM_DARK_BG if dark else LIGHT_MEDIUM_BG,
+            "fg": LIGHT_TEXT if dark else LIGHT_TEXT_DARK,
+            "muted": MEDIUM_TEXT if dark else LIGHT_ACCENT_USER,
+            "select_bg": SELECT_BG_COLOR if dark else LIGHT_MEDIUM_BG,
+            "font": (FONT_FAMILY, 14),
+        }
+        self.model_palette = ModelPalette(
+            self, self.model_index, self.select_model, self.toggle_favorite_model,
+            favorites=self.config.get("favorite_models", []), recent=self.config.get("recent_models", []),
+            notes=self._model_palette_notes(), colors=colors,
+        )
+        return "break"
+
+    def select_model(self, model):
+        self.model_var.set(model)
+        recent = [model] + [m for m in self.config.get("recent_models", []) if m != model]
+        self.config["recent_models"] = recent[:RECENT_MODELS_LIMIT]
+        save_config(self.config)
+
+    def toggle_favorite_model(self, model):
+        favorites = self.config.get("favorite_models", [])
+        self.config["favorite_models"] = [m for m in favorites if m != model] if model in favorites else favorites + [model]
+        save_config(self.config)
 
     def get_system_prompt(self):
         custom_prompt = self.system_prompt_text_widget.get("1.0", tk.END).strip()
@@ -938,21 +1450,46 @@ class VoyeurChat(tk.Tk):
         }
         return prompts.get(mode, self.config.get("default_system_prompt", "You are a helpful AI assistant."))
 
-    def get_context_limit_messages(self):
+    def get_context_limit_count(self):
         context_limit = self.context_limit_var.get()
         if context_limit == "No Limit":
-            return self.conversation_log
+            return None
         try:
-            num_messages = int(context_limit.split()[1])
-            return self.conversation_log[-num_messages:]
+            return int(context_limit.split()[1])
         except:
-            return self.conversation_log[-50:]
+            return 50
+
+    def build_prompt(self, selected_model_full):
+        """System prompt plus the newest history that fits the model's context window, less the reply's max tokens.
+
+        When the window is unknown only the message-count setting limits the history.
+        """
+        provider, _, model_id = selected_model_full.rpartition(": ")
+        info = model_info(provider, model_id)
+        # Reserve only what the model can actually return
+        max_tokens, _ = fit_max_tokens(info, self.max_tokens_var.get())
+        budget = info.context_window - max_tokens if info.context_window is not None else None
+        max_messages = self.get_context_limit_count()
+        messages = pack_context(self.get_system_prompt(), self.conversation_log, budget, max_messages)
+        history_sent = len(messages) - 1
+        # Only mention it when the token budget, not the message-count setting, left history out
+        if budget is not None and history_sent < min(len(self.conversation_log), max_messages or len(self.conversation_log)):
+            self.add_log_message(
+                f"Context: sending the newest {history_sent} of {len(self.conversation_log)} messages to fit {budget:,} tokens for {model_id}.",
+                "system"
+            )
+        return messages
 
     def send_message(self):
         user_text = self.user_input.get("1.0", tk.END).strip()
         if not user_text or self.placeholder_visible:
             return
+        if self._conversation_loading:
+            # The previous conversation's history is still in place; the text stays in the input
+            self.bell()
+            return
         self.add_log_message(user_text, "user")
+        self.transcript.scroll_to_end()
         self.user_input.delete("1.0", tk.END)
         self.after(100, self.process_ai_response)
 
@@ -978,6 +1515,9 @@ class VoyeurChat(tk.Tk):
         else:
             self.add_log_message(f"STT provider {provider} is not available.", "error")
             return
+        self.ui_queue.post(self._on_transcript, transcript)
+
+    def _on_transcript(self, transcript):
         if transcript:
             self.user_input.delete("1.0", tk.END)
             self.user_input.insert("1.0", transcript)
@@ -995,16 +1535,28 @@ class VoyeurChat(tk.Tk):
             self.openai_whisper_stt.stop_recording()
         self.record_button.config(text="🎤", command=self.start_recording)
 
+    def sampling_settings(self):
+        """The request settings from the advanced panel; Tk variables are only read on the Tk thread."""
+        return {
+            "max_tokens": self.max_tokens_var.get(),
+            "temperature": self.temperature_var.get(),
+            "top_p": self.top_p_var.get(),
+            "presence_penalty": self.presence_penalty_var.get(),
+            "frequency_penalty": self.frequency_penalty_var.get(),
+        }
+
     def process_ai_response(self):
         selected_model_full = self.model_var.get()
-        system_prompt = self.get_system_prompt()
-        messages = [{"role": "system", "content": system_prompt}] + self.get_context_limit_messages()
-        asyncio.run_coroutine_threadsafe(process_ai_response(self, selected_model_full, messages, self.config), self.loop)
+        messages = self.build_prompt(selected_model_full)
+        asyncio.run_coroutine_threadsafe(
+            process_ai_response(self, selected_model_full, messages, self.config, self.sampling_settings()), self.loop
+        )
 
     def refresh_models(self):
         self.add_log_message("Refreshing models...", "system")
         self.refresh_button.config(state=tk.DISABLED, text="Refreshing...")
-        self.after(100, lambda: asyncio.run_coroutine_threadsafe(self._fetch_all_models_thread(), self.loop))
+        # An explicit refresh revalidates every saved listing regardless of its age
+        self.after(100, lambda: asyncio.run_coroutine_threadsafe(self._fetch_all_models_thread(max_age=0), self.loop))
 
     def compare_models(self):
         selected_model_full = self.model_var.get()
@@ -1015,11 +1567,12 @@ class VoyeurChat(tk.Tk):
         if len(comparison_models) < 2:
             self.add_log_message("Not enough models available for comparison.", "error")
             return
-        system_prompt = self.get_system_prompt()
-        messages = [{"role": "system", "content": system_prompt}] + self.get_context_limit_messages()
+        settings = self.sampling_settings()
         for model in [selected_model_full] + comparison_models:
             self.add_log_message(f"Generating response with {model}...", "system")
-            asyncio.run_coroutine_threadsafe(process_ai_response(self, model, messages, self.config), self.loop)
+            # Each model gets history packed to its own context window
+            messages = self.build_prompt(model)
+            asyncio.run_coroutine_threadsafe(process_ai_response(self, model, messages, self.config, settings), self.loop)
 
     def upload_file(self):
         file_path = filedialog.askopenfilename(filetypes=[("PDF files", "*.pdf"), ("Text files", "*.txt")])
@@ -1046,23 +1599,27 @@ class VoyeurChat(tk.Tk):
         if not self.current_conversation_id:
             self.add_log_message("No conversation selected.", "error")
             return
-        messages = asyncio.run_coroutine_threadsafe(fetch_messages_from_db(self.current_conversation_id), self.loop).result()
-        export_data = [{"role": msg["role"], "content": msg["content"], "timestamp": msg["timestamp"]} for msg in messages]
         format_choice = simpledialog.askstring("Export Format", "Enter format (json/md):", initialvalue="json", parent=self)
+        if not format_choice:
+            return
         file_path = filedialog.asksaveasfilename(defaultextension=f".{format_choice}", filetypes=[(f"{format_choice.upper()} files", f"*.{format_choice}")])
         if not file_path:
             return
-        try:
-            if format_choice.lower() == "json":
-                with open(file_path, "w") as f:
-                    json.dump(export_data, f, indent=2)
-            else:
-                with open(file_path, "w") as f:
-                    for msg in export_data:
-                        f.write(f"**{msg['role'].capitalize()}** ({msg['timestamp']}): {msg['content']}\n\n")
-            self.add_log_message(f"Conversation exported to {file_path}", "system")
-        except Exception as e:
-            self.add_log_message(f"Error exporting conversation: {str(e)}", "error")
+
+        def on_loaded(messages):
+            export_data = [{"role": msg["role"], "content": msg["content"], "timestamp": msg["timestamp"]} for msg in messages]
+            try:
+                if format_choice.lower() == "json":
+                    with open(file_path, "w") as f:
+                        json.dump(export_data, f, indent=2)
+                else:
+                    with open(file_path, "w") as f:
+                        for msg in export_data:
+                            f.write(f"**{msg['role'].capitalize()}** ({msg['timestamp']}): {msg['content']}\n\n")
+                self.add_log_message(f"Conversation exported to {file_path}", "system")
+            except Exception as e:
+                self.add_log_message(f"Error exporting conversation: {str(e)}", "error")
+        self.submit(fetch_messages_from_db(self.current_conversation_id), on_loaded)
 
     def delete_selected_thread(self):
         selection = self.chat_listbox.curselection()
@@ -1070,21 +1627,12 @@ class VoyeurChat(tk.Tk):
             messagebox.showwarning("No Selection", "Please select a conversation thread to delete.")
             return
         conv_index = selection[0]
-        conv_id = self.conversation_id_map.get(conv_index)
+        conv_id = self._chat_id_at(conv_index)
         if conv_id and messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this conversation thread?"):
-            asyncio.run_coroutine_threadsafe(delete_conversation_in_db(conv_id), self.loop)
             if conv_id == self.current_conversation_id:
                 self.current_conversation_id = None
-            del self.conversation_id_map[conv_index]
-            new_map = {}
-            for idx in range(self.chat_listbox.size()):
-                if idx < conv_index:
-                    new_map[idx] = self.conversation_id_map.get(idx)
-                elif idx > conv_index and (idx - 1) in self.conversation_id_map:
-                    new_map[idx - 1] = self.conversation_id_map.get(idx)
-            self.conversation_id_map = new_map
-            self.refresh_chat_list()
-            self.load_or_create_conversation()
+                self.clear_transcript()
+            self.submit(delete_conversation_in_db(conv_id), lambda _: self.load_or_create_conversation())
 
     def clear_placeholder_text(self, event=None):
         if self.placeholder_visible:
@@ -1161,15 +1709,14 @@ class VoyeurChat(tk.Tk):
         self.load_initial_models()
 
     def on_model_change(self, *args):
+        new_model = self.model_var.get()
+        if not new_model or new_model in ("No models available", "Loading models..."):
+            return
         if self.current_conversation_id:
-            new_model = self.model_var.get()
-            if new_model and new_model != "No models available" and new_model != "Loading models...":
-                async def update_model():
-                    async with aiosqlite.connect(DB_PATH) as db:
-                        await db.execute("UPDATE conversations SET llm_model = ? WHERE id = ?", (new_model, self.current_conversation_id))
-                        await db.commit()
-                asyncio.run_coroutine_threadsafe(update_model(), self.loop)
-                self.add_log_message(f"Model updated to {new_model} for this conversation.", "system")
+            asyncio.run_coroutine_threadsafe(update_conversation_model_in_db(self.current_conversation_id, new_model), self.loop)
+            self.add_log_message(f"Model updated to {new_model} for this conversation.", "system")
+        provider, _, model_id = new_model.rpartition(": ")
+        self.add_log_message(f"{model_id}: {describe_model(model_info(provider, model_id))}.", "system")
 
     def on_chat_mode_change(self, *args):
         self.add_log_message(f"Chat mode changed to {self.current_chat_mode.get()}.", "system")
@@ -1177,7 +1724,22 @@ class VoyeurChat(tk.Tk):
     def on_closing(self):
         content = self.user_input.get("1.0", tk.END).strip()
         if content and not self.placeholder_visible and self.current_conversation_id:
-            asyncio.run_coroutine_threadsafe(save_draft(self.current_conversation_id, content), self.loop)
+            try:
+                asyncio.run_coroutine_threadsafe(save_draft(self.current_conversation_id, content), self.loop).result(timeout=5)
+            except Exception as e:
+                print(f"Error saving draft: {e}")
+        try:
+            asyncio.run_coroutine_threadsafe(flush_writes(), self.loop).result(timeout=10)
+        except Exception as e:
+            print(f"Error saving pending messages: {e}")
+        try:
+            asyncio.run_coroutine_threadsafe(close_clients(), self.loop).result(timeout=5)
+        except Exception as e:
+            print(f"Error closing provider clients: {e}")
+        try:
+            asyncio.run_coroutine_threadsafe(close_database(), self.loop).result(timeout=5)
+        except Exception as e:
+            print(f"Error closing database: {e}")
         self.loop.call_soon_threadsafe(self.loop.stop)
         self.thread.join()
         self.destroy()
\ No newline at end of file